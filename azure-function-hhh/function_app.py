@@ -1,156 +1,356 @@
-# function_app.py
-
-import azure.functions as func
-import logging
-import json
-from pydantic import BaseModel, ValidationError
-from typing import List, Optional, Dict, Any
-
-# Import helper class and data loader from the sibling file
-from matcher import PropertyMatcher, load_homes_data 
-
-# Set up logging for the Azure Function host
-logger = logging.getLogger('azure.functions')
-
-# --- Pydantic Models (Copied from original main.py) ---
-class UserPreferences(BaseModel):
-    homeType: str
-    budget: int
-    amenities: List[str]
-    customNeeds: Optional[str] = ""
-
-class HomeBase(BaseModel):
-    id: int
-    name: str
-    type: str
-    price: int
-    sq_ft: int
-    bedrooms: int
-    bathrooms: float
-    amenities: List[str]
-    location: str
-    description: str
-
-class MatchedHome(HomeBase):
-    score: float
-    explanation: str
-
-class MatchResponse(BaseModel):
-    matches: List[MatchedHome]
-    message: Optional[str] = None
-# --- End Pydantic Models ---
-
-
-# --- Global Initialization ---
-# This code runs once when the function app instance starts (cold start)
-HOMES_LOADED = False
-HOMES_COUNT = 0
-MATCHER = None
-
-try:
-    homes_data = load_homes_data()
-    MATCHER = PropertyMatcher(homes_data)
-    HOMES_COUNT = len(homes_data)
-    HOMES_LOADED = True
-    logger.info(f"Initialized PropertyMatcher with {HOMES_COUNT} homes.")
-except Exception as e:
-    logger.error(f"Failed to initialize PropertyMatcher: {e}")
-
-# Initialize the Function App object
-app = func.FunctionApp()
-
-
-# ----------------------------------------------------------------------
-# 1. HealthCheck Endpoint (GET /api/health)
-# ----------------------------------------------------------------------
-@app.route(route="health", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
-def health_check(req: func.HttpRequest) -> func.HttpResponse:
-    """Health check endpoint using the Python V2 model."""
-    logger.info('Health check request received.')
-
-    response_data = {
-        "status": "healthy", 
-        "homes_loaded": HOMES_COUNT,
-        "message": "API operational"
-    }
-    
-    status_code = 200
-    if not HOMES_LOADED:
-        response_data['status'] = 'data_error'
-        response_data['message'] = 'API operational but homes data failed to load.'
-        status_code = 503
-
-    return func.HttpResponse(
-        json.dumps(response_data),
-        mimetype="application/json",
-        status_code=status_code
-    )
-
-
-# ----------------------------------------------------------------------
-# 2. MatchProperties Endpoint (POST /api/match)
-# ----------------------------------------------------------------------
-@app.route(route="match", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
-def match_properties(req: func.HttpRequest) -> func.HttpResponse:
-    """Property matching endpoint using the Python V2 model."""
-    logger.info('Property match request received.')
-
-    # 1. Check Initialization
-    if not HOMES_LOADED or MATCHER is None:
-        return func.HttpResponse(
-             json.dumps({"error": "Service unavailable: Matcher not initialized.", "matches": []}),
-             mimetype="application/json",
-             status_code=503
-        )
-        
-    # 2. Get Request Body
-    try:
-        req_body = req.get_json()
-    except ValueError:
-        return func.HttpResponse("Please pass a valid JSON payload.", status_code=400)
-
-    # 3. Validate Request Body with Pydantic
-    try:
-        preferences = UserPreferences(**req_body)
-    except ValidationError as e:
-        logger.warning(f"Validation Error: {e.errors()}")
-        return func.HttpResponse(
-             json.dumps({"error": "Invalid request format", "details": e.errors()}),
-             mimetype="application/json",
-             status_code=400
-        )
-
-    # 4. Process Request
-    try:
-        # Use the PropertyMatcher to find and rank homes
-        matched_homes_raw: List[Dict[str, Any]] = MATCHER.find_matches(
-            home_type=preferences.homeType,
-            budget=preferences.budget,
-            amenities=preferences.amenities,
-            custom_needs=preferences.customNeeds
-        )
-        
-        # Convert to Pydantic objects for clean output
-        results = [MatchedHome(**home) for home in matched_homes_raw]
-        
-        message = None
-        if not results:
-            message = "No properties found matching your criteria. Try adjusting your preferences."
-
-        response = MatchResponse(matches=results, message=message)
-        
-        # 5. Return Response
-        return func.HttpResponse(
-            # Pydantic's method for reliable JSON serialization
-            response.model_dump_json(by_alias=True, indent=2), 
-            mimetype="application/json",
-            status_code=200
-        )
-    
-    except Exception as e:
-        logger.error(f"Internal processing error: {e}", exc_info=True)
-        return func.HttpResponse(
-             json.dumps({"error": "Internal server error during property matching.", "details": str(e)}),
-             mimetype="application/json",
-             status_code=500
-        )
\ No newline at end of file
+# function_app.py
+
+import azure.functions as func
+import logging
+import json
+import os
+import sys
+from urllib.parse import parse_qs, urlparse
+from pydantic import ValidationError
+
+# The matching core is shared with the FastAPI backend. Deployments vendor a
+# copy next to this file (see DEPLOYMENT.md); local runs use the repo root.
+FUNCTION_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(FUNCTION_DIR))
+
+# Set up logging for the Azure Function host
+logger = logging.getLogger('azure.functions')
+
+
+# --- Global Initialization ---
+# This code runs once when the function app instance starts (cold start).
+# Warm invocations reuse the same matcher: listings, dedup clusters, column
+# indexes and the Anthropic client's connection pool. PropertyMatcher is safe
+# to call from the host's concurrent invocation threads; its LLM calls share
+# one bounded executor (MATCH_LLM_WORKERS). The facet index, saved searches
+# and admission queue are the same shared components the FastAPI backend uses.
+# The core is imported here too, so a deployment published without its
+# vendored copy still starts and reports the failure on /api/health.
+HOMES_LOADED = False
+INIT_ERROR = None
+MATCHER = None
+FACETS = None
+SAVED_SEARCHES = None
+ADMISSION = None
+
+try:
+    from matching_core import (
+        AdmissionController,
+        AdmissionRejected,
+        Home,
+        ListingWriteDenied,
+        MatchResponse,
+        MatchTrace,
+        QueryTooBroad,
+        UserPreferences,
+        authorize_listing_write,
+        check_query_breadth,
+        get_admission_controller,
+        get_facet_index,
+        get_matcher,
+        get_saved_searches,
+    )
+
+    ADMISSION = get_admission_controller()
+    MATCHER = get_matcher(FUNCTION_DIR)
+    FACETS = get_facet_index(MATCHER)
+    SAVED_SEARCHES = get_saved_searches(MATCHER)
+    HOMES_LOADED = True
+    logger.info(f"Initialized PropertyMatcher with {len(MATCHER.homes)} homes.")
+except Exception as e:
+    INIT_ERROR = f"{type(e).__name__}: {e}"
+    logger.error(f"Failed to initialize PropertyMatcher: {INIT_ERROR}")
+
+# Initialize the Function App object
+app = func.FunctionApp()
+
+
+# ----------------------------------------------------------------------
+# 1. HealthCheck Endpoint (GET /api/health)
+# ----------------------------------------------------------------------
+@app.route(route="health", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def health_check(req: func.HttpRequest) -> func.HttpResponse:
+    """Health check endpoint using the Python V2 model."""
+    logger.info('Health check request received.')
+
+    response_data = {
+        "status": "healthy", 
+        "homes_loaded": len(MATCHER.homes) if MATCHER else 0,
+        "unique_homes": MATCHER.index.size if MATCHER else 0,
+        "llm_backend": MATCHER.backend.name if MATCHER else None,
+        "ranker_loaded": MATCHER is not None and MATCHER.ranker is not None,
+        "message": "API operational"
+    }
+    
+    status_code = 200
+    if not HOMES_LOADED:
+        response_data['status'] = 'data_error'
+        response_data['message'] = 'API operational but homes data failed to load.'
+        response_data['error'] = INIT_ERROR
+        status_code = 503
+
+    return func.HttpResponse(
+        json.dumps(response_data),
+        mimetype="application/json",
+        status_code=status_code
+    )
+
+
+def _json_response(data, status_code: int = 200, headers=None) -> func.HttpResponse:
+    return func.HttpResponse(
+        json.dumps(data, default=str),
+        mimetype="application/json",
+        status_code=status_code,
+        headers=headers
+    )
+
+
+def _not_initialized() -> func.HttpResponse:
+    return _json_response(
+        {"error": "Service unavailable: Matcher not initialized.", "matches": []}, 503
+    )
+
+
+def _rejected(e: "AdmissionRejected") -> func.HttpResponse:
+    return _json_response(
+        {"error": f"Too many match requests ({e.reason}). Retry later."},
+        e.status_code,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+def _parse_preferences(req: func.HttpRequest):
+    """Validate the request body; returns (preferences, None) or (None, error response)"""
+    if not HOMES_LOADED or MATCHER is None:
+        return None, _not_initialized()
+
+    try:
+        req_body = req.get_json()
+    except ValueError:
+        return None, func.HttpResponse("Please pass a valid JSON payload.", status_code=400)
+
+    try:
+        return UserPreferences(**req_body), None
+    except ValidationError as e:
+        logger.warning(f"Validation Error: {e.errors()}")
+        return None, func.HttpResponse(
+             json.dumps({"error": "Invalid request format", "details": e.errors()}, default=str),
+             mimetype="application/json",
+             status_code=400
+        )
+
+
+# ----------------------------------------------------------------------
+# 2. MatchProperties Endpoint (POST /api/match[?explain=true])
+# ----------------------------------------------------------------------
+@app.route(route="match", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+async def match_properties(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Property matching endpoint using the Python V2 model.
+
+    Like the FastAPI backend, requests pass through the admission controller
+    (X-Priority: interactive | batch; 429/503 with Retry-After when saturated)
+    and are rejected with 422 above MATCH_REJECT_ABOVE_CANDIDATES.
+    """
+    logger.info('Property match request received.')
+
+    # 1. Check initialization and validate the request body
+    preferences, error = _parse_preferences(req)
+    if error is not None:
+        return error
+
+    priority = req.headers.get("x-priority", "interactive")
+    if priority not in AdmissionController.PRIORITIES:
+        return _json_response(
+            {"error": f"Unknown priority '{priority}'. Expected one of: {', '.join(AdmissionController.PRIORITIES)}"},
+            400
+        )
+
+    try:
+        check_query_breadth(MATCHER, preferences.matcher_kwargs())
+    except QueryTooBroad as e:
+        return _json_response({"error": str(e)}, 422)
+
+    explain = req.params.get("explain", "").lower() in ("1", "true")
+    trace = MatchTrace()
+
+    # 2. Process Request
+    try:
+        # Use the shared PropertyMatcher to find and rank homes. The Functions
+        # host cannot report client disconnects, so queued requests always run.
+        matched_homes, queue_wait_ms = await ADMISSION.run(
+            priority, MATCHER.find_matches, trace=trace, **preferences.matcher_kwargs()
+        )
+        trace.stages.insert(0, {"stage": "queue_wait", "ms": round(queue_wait_ms, 3)})
+        response = MatchResponse.from_matches(
+            matched_homes, explain=trace.to_dict() if explain else None
+        )
+        
+        # 3. Return Response
+        return func.HttpResponse(
+            # Pydantic's method for reliable JSON serialization
+            response.model_dump_json(by_alias=True, indent=2), 
+            mimetype="application/json",
+            status_code=200,
+            headers={"X-Queue-Wait-Ms": f"{queue_wait_ms:.1f}"}
+        )
+    
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except Exception as e:
+        logger.error(f"Internal processing error: {e}", exc_info=True)
+        return func.HttpResponse(
+             json.dumps({"error": "Internal server error during property matching.", "details": str(e)}),
+             mimetype="application/json",
+             status_code=500
+        )
+
+
+# ----------------------------------------------------------------------
+# 3. EstimateMatch Endpoint (POST /api/match/estimate)
+# ----------------------------------------------------------------------
+@app.route(route="match/estimate", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+def estimate_match(req: func.HttpRequest) -> func.HttpResponse:
+    """Estimate a match request's candidates and tokens without running it."""
+    preferences, error = _parse_preferences(req)
+    if error is not None:
+        return error
+
+    return func.HttpResponse(
+        json.dumps(MATCHER.estimate_cost(**preferences.matcher_kwargs())),
+        mimetype="application/json",
+        status_code=200
+    )
+
+
+# ----------------------------------------------------------------------
+# 4. Metrics Endpoint (GET /api/metrics)
+# ----------------------------------------------------------------------
+@app.route(route="metrics", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def metrics(req: func.HttpRequest) -> func.HttpResponse:
+    """Admission queue depth, rejections and queue wait times for this instance."""
+    if ADMISSION is None:
+        return _not_initialized()
+
+    return _json_response({"admission": ADMISSION.stats()})
+
+
+# ----------------------------------------------------------------------
+# 5. Facets Endpoint (GET /api/facets)
+# ----------------------------------------------------------------------
+def _facet_kwargs(req: func.HttpRequest):
+    """FacetIndex.query arguments; repeated parameters are OR'ed as in the backend"""
+    params = parse_qs(urlparse(req.url).query)
+
+    def last_int(name):
+        return int(params[name][-1]) if name in params else None
+
+    return {
+        "home_types": params.get("type"),
+        "amenities": params.get("amenities"),
+        "locations": params.get("location"),
+        "bedrooms": [int(value) for value in params["bedrooms"]] if "bedrooms" in params else None,
+        "min_price": last_int("minPrice"),
+        "max_price": last_int("maxPrice"),
+        "histograms": params.get("histograms")
+    }
+
+
+@app.route(route="facets", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def facets(req: func.HttpRequest) -> func.HttpResponse:
+    """Live facet counts and price histograms, served from precomputed bitmaps."""
+    if FACETS is None:
+        return _not_initialized()
+
+    try:
+        kwargs = _facet_kwargs(req)
+    except ValueError:
+        return _json_response({"error": "bedrooms, minPrice and maxPrice must be integers"}, 400)
+
+    return _json_response(FACETS.query(**kwargs))
+
+
+# ----------------------------------------------------------------------
+# 6. Listing Writes (PUT/DELETE /api/homes/{home_id}, admin token required)
+# ----------------------------------------------------------------------
+@app.route(route="homes/{home_id:int}", methods=["PUT", "DELETE"], auth_level=func.AuthLevel.FUNCTION)
+def write_home(req: func.HttpRequest) -> func.HttpResponse:
+    """Add, update or remove a listing on this instance; indexes update incrementally."""
+    if MATCHER is None:
+        return _not_initialized()
+
+    try:
+        authorize_listing_write(req.headers.get("x-admin-token"))
+    except ListingWriteDenied as e:
+        return _json_response({"error": str(e)}, 403)
+
+    home_id = int(req.route_params["home_id"])
+    if req.method == "DELETE":
+        if MATCHER.remove_home(home_id) is None:
+            return _json_response({"error": f"Home {home_id} not found"}, 404)
+        return _json_response({"deleted": home_id})
+
+    try:
+        home = Home(**req.get_json())
+    except ValueError as e:
+        # pydantic's ValidationError is a ValueError, as is a malformed body
+        return _json_response({"error": "Invalid listing", "details": str(e)}, 400)
+    if home.id != home_id:
+        return _json_response({"error": "Path id does not match listing id"}, 400)
+
+    MATCHER.upsert_home(home.model_dump())
+    return func.HttpResponse(home.model_dump_json(), mimetype="application/json", status_code=200)
+
+
+# ----------------------------------------------------------------------
+# 7. Saved Searches (/api/saved-searches)
+# ----------------------------------------------------------------------
+@app.route(route="saved-searches", methods=["POST"], auth_level=func.AuthLevel.FUNCTION)
+async def create_saved_search(req: func.HttpRequest) -> func.HttpResponse:
+    """Save a search; its top 3 is kept current as listings change on this instance."""
+    preferences, error = _parse_preferences(req)
+    if error is not None:
+        return error
+
+    try:
+        search, _ = await ADMISSION.run(
+            "batch", SAVED_SEARCHES.add, preferences=preferences.matcher_kwargs()
+        )
+    except AdmissionRejected as e:
+        return _rejected(e)
+    return _json_response(search)
+
+
+@app.route(route="saved-searches/events", methods=["GET"], auth_level=func.AuthLevel.FUNCTION)
+def saved_search_events(req: func.HttpRequest) -> func.HttpResponse:
+    """Poll top-3 change events; pass the returned `next` cursor as `since`."""
+    if SAVED_SEARCHES is None:
+        return _not_initialized()
+
+    try:
+        since = int(req.params.get("since", "0"))
+        limit = int(req.params.get("limit", "100"))
+    except ValueError:
+        return _json_response({"error": "since and limit must be integers"}, 400)
+
+    return _json_response(
+        SAVED_SEARCHES.events(since=since, search_id=req.params.get("searchId"), limit=limit)
+    )
+
+
+@app.route(route="saved-searches/{search_id}", methods=["GET", "DELETE"], auth_level=func.AuthLevel.FUNCTION)
+def saved_search(req: func.HttpRequest) -> func.HttpResponse:
+    """Current top 3 for a saved search, or stop tracking it."""
+    if SAVED_SEARCHES is None:
+        return _not_initialized()
+
+    search_id = req.route_params["search_id"]
+    if req.method == "DELETE":
+        if not SAVED_SEARCHES.remove(search_id):
+            return _json_response({"error": f"Saved search {search_id} not found"}, 404)
+        return _json_response({"deleted": search_id})
+
+    search = SAVED_SEARCHES.get(search_id)
+    if search is None:
+        return _json_response({"error": f"Saved search {search_id} not found"}, 404)
+    return _json_response(search)
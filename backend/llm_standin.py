@@ -0,0 +1,64 @@
+"""
+Local LLM Stand-in Server
+Speaks the Anthropic Messages API (POST /v1/messages) so the real SDK can be
+pointed at it with ANTHROPIC_BASE_URL for network-free load testing.
+
+Usage:
+    python llm_standin.py --port 8787 --latency-ms 400 --tokens-per-sec 80
+    ANTHROPIC_BASE_URL=http://localhost:8787 ANTHROPIC_API_KEY=dummy uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from typing import List, Dict, Any, Optional
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching_core.llm_backends import StandInBackend
+
+app = FastAPI(title="LLM Stand-in", version="1.0.0")
+backend = StandInBackend()
+
+
+class MessagesRequest(BaseModel):
+    model: str
+    max_tokens: int
+    messages: List[Dict[str, Any]]
+    temperature: Optional[float] = 1.0
+
+
+@app.post("/v1/messages")
+async def create_message(request: MessagesRequest):
+    """Messages API compatible endpoint backed by StandInBackend"""
+    # Run in a worker thread so simulated latency does not block other requests
+    message = await asyncio.to_thread(
+        backend.create_message,
+        request.model,
+        request.max_tokens,
+        request.temperature,
+        request.messages
+    )
+    return message.to_dict()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Messages API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=80.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    args = parser.parse_args()
+
+    backend.latency_ms = args.latency_ms
+    backend.tokens_per_second = args.tokens_per_sec
+    backend.jitter = args.jitter
+
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,95 @@
+"""
+Concurrent load generator for the /match endpoint
+Standard library plus matching_core/stats.py (imported on its own, not
+through the package and its pydantic models), so it runs on an offline box
+next to the backend.
+
+Usage:
+    python loadtest.py --url http://localhost:8000 --concurrency 50 --requests 500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "matching_core"))
+
+from stats import percentile
+
+SAMPLE_PREFERENCES = [
+    {"homeType": "single-family", "budget": 500000, "amenities": ["pool", "park"],
+     "customNeeds": "Need a home office and large backyard"},
+    {"homeType": "condo", "budget": 400000, "amenities": ["gym"], "customNeeds": ""},
+    {"homeType": "any", "budget": 1000000, "amenities": ["pool", "gym", "spa"],
+     "customNeeds": "Love golf"},
+]
+
+
+def send_request(url: str, payload: dict, timeout: float, priority: str = "interactive"):
+    """POST one match request, returning (status, latency_ms)"""
+    data = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(
+        f"{url}/match", data=data,
+        headers={"Content-Type": "application/json", "X-Priority": priority}
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 0
+    return status, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /match")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--batch-every", type=int, default=0,
+                        help="send every Nth request with X-Priority: batch (0 = none)")
+    args = parser.parse_args()
+
+    statuses = {}
+    latencies = {"interactive": [], "batch": []}
+    lock = threading.Lock()
+
+    def worker(i):
+        priority = "batch" if args.batch_every and i % args.batch_every == 0 else "interactive"
+        status, latency = send_request(
+            args.url, SAMPLE_PREFERENCES[i % len(SAMPLE_PREFERENCES)], args.timeout, priority
+        )
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            latencies[priority].append(latency)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    print(f"requests:    {args.requests} @ concurrency {args.concurrency}")
+    print(f"elapsed:     {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"statuses:    {statuses}")
+    for priority, samples in latencies.items():
+        if not samples:
+            continue
+        samples.sort()
+        print(f"[{priority}] latency p50: {statistics.median(samples):.0f} ms, "
+              f"p95: {percentile(samples, 0.95):.0f} ms, "
+              f"max: {samples[-1]:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,33 @@ FastAPI Backend for AI Property Matchmaker
 Handles property matching requests using mock AI/LLM logic
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
 from typing import List, Optional
-import json
 import os
-from matcher import PropertyMatcher
+import sys
+
+# The matching core is shared with the Azure Function and lives at the repo root
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BACKEND_DIR))
+
+from matching_core import (
+    AdmissionController,
+    AdmissionRejected,
+    ClientDisconnected,
+    Home,
+    ListingWriteDenied,
+    MatchResponse,
+    MatchTrace,
+    QueryTooBroad,
+    UserPreferences,
+    authorize_listing_write,
+    check_query_breadth,
+    get_admission_controller,
+    get_facet_index,
+    get_matcher,
+    get_saved_searches,
+)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -27,54 +47,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Pydantic models for request/response validation
-class UserPreferences(BaseModel):
-    homeType: str
-    budget: int
-    amenities: List[str]
-    customNeeds: Optional[str] = ""
-
-class Home(BaseModel):
-    id: int
-    name: str
-    type: str
-    price: int
-    sq_ft: int
-    bedrooms: int
-    bathrooms: float
-    amenities: List[str]
-    location: str
-    description: str
-
-class MatchedHome(Home):
-    score: float
-    explanation: str
-
-class MatchResponse(BaseModel):
-    matches: List[MatchedHome]
-    message: Optional[str] = None
-
-# Load homes data from JSON file
-def load_homes_data():
-    """Load property data from homes.json file"""
-    # Get the path to the data directory (one level up from backend)
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_path = os.path.join(current_dir, '..', 'data', 'homes.json')
-    
-    try:
-        with open(data_path, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        # Fallback to relative path if absolute path fails
-        try:
-            with open('../data/homes.json', 'r') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            raise Exception("Could not find homes.json file")
-
-# Initialize the property matcher
-homes_data = load_homes_data()
-matcher = PropertyMatcher(homes_data)
+# Initialize the property matcher (one warm instance per worker process)
+matcher = get_matcher(BACKEND_DIR)
+
+# Bounded, prioritized queue in front of the matcher so spikes are shed
+# quickly instead of fanning out to the LLM provider
+admission = get_admission_controller()
+
+# Precomputed facet aggregates, kept current as listings change
+facet_index = get_facet_index(matcher)
+
+# Saved searches are re-scored in the background when a listing change affects them
+saved_searches = get_saved_searches(matcher)
 
 @app.get("/")
 async def root():
@@ -83,66 +67,213 @@ async def root():
         "message": "AI Property Matchmaker API",
         "version": "1.0.0",
         "endpoints": {
-            "/match": "POST - Match properties based on user preferences",
-            "/health": "GET - Health check endpoint"
+            "/match": "POST - Match properties based on user preferences (?explain=true for the plan)",
+            "/match/estimate": "POST - Pre-execution cost estimate for a match request",
+            "/facets": "GET - Listing counts and price histograms per facet",
+            "/homes/{id}": "PUT/DELETE - Add, update or remove a listing (admin token required)",
+            "/saved-searches": "POST - Save preferences; GET /saved-searches/events for top-3 changes",
+            "/health": "GET - Health check endpoint",
+            "/metrics": "GET - Admission queue depth, rejections and queue wait times"
         }
     }
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "homes_loaded": len(homes_data)}
+    return {
+        "status": "healthy",
+        "homes_loaded": len(matcher.homes),
+        "unique_homes": matcher.index.size,
+        "llm_backend": matcher.backend.name,
+        "ranker_loaded": matcher.ranker is not None
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Admission controller metrics, including queue wait time per priority"""
+    return {"admission": admission.stats()}
+
+async def _admit(request: Request, priority: str, func, **kwargs):
+    """Run a matcher call through the admission controller, mapping rejections to HTTP errors"""
+    if priority not in AdmissionController.PRIORITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown priority '{priority}'. Expected one of: {', '.join(AdmissionController.PRIORITIES)}"
+        )
+    try:
+        return await admission.run(
+            priority, func, is_disconnected=request.is_disconnected, **kwargs
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Too many match requests ({e.reason}). Retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client disconnected while queued")
+
+@app.post("/match/estimate")
+async def estimate_match(preferences: UserPreferences):
+    """
+    Estimate a match request's cost without running it
+    
+    Returns the estimated candidate count, how many would reach the LLM and
+    the expected prompt/completion tokens, so callers or a gateway can
+    reject or downgrade broad queries up front.
+    """
+    return matcher.estimate_cost(**preferences.matcher_kwargs())
 
 @app.post("/match", response_model=MatchResponse)
-async def match_properties(preferences: UserPreferences):
+async def match_properties(
+    preferences: UserPreferences,
+    request: Request,
+    response: Response,
+    explain: bool = False,
+    x_priority: str = Header("interactive")
+):
     """
     Match properties based on user preferences
     
+    Structured `filters` (price/bedrooms/bathrooms/sq_ft ranges and
+    required amenities) are applied before scoring, so only qualifying
+    homes are sent to the LLM.
+    
     This endpoint uses a mock AI/LLM system that:
     1. Scores properties based on budget matching
     2. Evaluates amenity overlap
     3. Uses text similarity for custom needs
     4. Generates natural language explanations
     
-    Returns top 3 matching properties
+    Returns top 3 matching properties. With ?explain=true the response also
+    carries the execution plan, candidate counts per stage, estimated vs.
+    actual tokens, cache hits and time per stage.
+    
+    Requests pass through the admission controller; send `X-Priority: batch`
+    for CRM/bulk traffic so interactive users are served first. When the
+    queue is saturated the response is 429/503 with Retry-After.
     """
     try:
-        # Use the PropertyMatcher to find and rank homes
-        matched_homes = matcher.find_matches(
-            home_type=preferences.homeType,
-            budget=preferences.budget,
-            amenities=preferences.amenities,
-            custom_needs=preferences.customNeeds
+        check_query_breadth(matcher, preferences.matcher_kwargs())
+    except QueryTooBroad as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    trace = MatchTrace()
+    
+    try:
+        # Use the PropertyMatcher to find and rank homes. The admission
+        # controller bounds how many run at once and queues the rest by priority.
+        matched_homes, queue_wait_ms = await _admit(
+            request,
+            x_priority,
+            matcher.find_matches,
+            trace=trace,
+            **preferences.matcher_kwargs()
         )
+        response.headers["X-Queue-Wait-Ms"] = f"{queue_wait_ms:.1f}"
+        trace.stages.insert(0, {"stage": "queue_wait", "ms": round(queue_wait_ms, 3)})
         
-        # Convert to MatchedHome objects
-        results = []
-        for home in matched_homes:
-            matched_home = MatchedHome(
-                id=home['id'],
-                name=home['name'],
-                type=home['type'],
-                price=home['price'],
-                sq_ft=home['sq_ft'],
-                bedrooms=home['bedrooms'],
-                bathrooms=home['bathrooms'],
-                amenities=home['amenities'],
-                location=home['location'],
-                description=home['description'],
-                score=home['score'],
-                explanation=home['explanation']
-            )
-            results.append(matched_home)
-        
-        message = None
-        if len(results) == 0:
-            message = "No properties found matching your criteria. Try adjusting your preferences."
-        
-        return MatchResponse(matches=results, message=message)
+        return MatchResponse.from_matches(
+            matched_homes, explain=trace.to_dict() if explain else None
+        )
     
+    except HTTPException:
+        # Admission rejections (429/503) keep their status and Retry-After
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/facets")
+async def get_facets(
+    type: Optional[List[str]] = Query(None),
+    amenities: Optional[List[str]] = Query(None),
+    location: Optional[List[str]] = Query(None),
+    bedrooms: Optional[List[int]] = Query(None),
+    minPrice: Optional[int] = None,
+    maxPrice: Optional[int] = None,
+    histograms: Optional[List[str]] = Query(None)
+):
+    """
+    Live facet counts for the search UI
+    
+    Repeat a parameter to OR values (type=condo&type=townhouse); every
+    requested amenity is required. Per-value price histograms are returned
+    for the facets named in `histograms` (type, amenities, location,
+    bedrooms). Served from precomputed bitmaps, so no matching or LLM
+    work is done.
+    """
+    return facet_index.query(
+        home_types=type,
+        amenities=amenities,
+        locations=location,
+        bedrooms=bedrooms,
+        min_price=minPrice,
+        max_price=maxPrice,
+        histograms=histograms
+    )
+
+def require_listing_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow listing writes only with the LISTING_ADMIN_TOKEN shared secret"""
+    try:
+        authorize_listing_write(x_admin_token)
+    except ListingWriteDenied as e:
+        raise HTTPException(status_code=403, detail=str(e))
+
+@app.put("/homes/{home_id}", response_model=Home, dependencies=[Depends(require_listing_admin)])
+def upsert_home(home_id: int, home: Home):
+    """
+    Add or update a listing; indexes are updated incrementally
+    
+    Internal data-refresh endpoint: requires `X-Admin-Token` matching
+    LISTING_ADMIN_TOKEN, and is disabled when that is unset.
+    """
+    if home.id != home_id:
+        raise HTTPException(status_code=400, detail="Path id does not match listing id")
+    
+    matcher.upsert_home(home.model_dump())
+    return home
+
+@app.delete("/homes/{home_id}", dependencies=[Depends(require_listing_admin)])
+def delete_home(home_id: int):
+    """Remove a listing; indexes are updated incrementally (admin token required)"""
+    removed = matcher.remove_home(home_id)
+    if removed is None:
+        raise HTTPException(status_code=404, detail=f"Home {home_id} not found")
+    
+    return {"deleted": home_id}
+
+@app.post("/saved-searches")
+async def create_saved_search(preferences: UserPreferences, request: Request):
+    """Save a search; its top 3 is kept current as listings change"""
+    search, _ = await _admit(
+        request, "batch", saved_searches.add, preferences=preferences.matcher_kwargs()
+    )
+    return search
+
+@app.get("/saved-searches/events")
+async def saved_search_events(since: int = 0, searchId: Optional[str] = None, limit: int = 100):
+    """
+    Poll top-3 change events for saved searches
+    
+    Pass the returned `next` cursor as `since` on the following call.
+    """
+    return saved_searches.events(since=since, search_id=searchId, limit=limit)
+
+@app.get("/saved-searches/{search_id}")
+async def get_saved_search(search_id: str):
+    """Current top 3 for a saved search"""
+    search = saved_searches.get(search_id)
+    if search is None:
+        raise HTTPException(status_code=404, detail=f"Saved search {search_id} not found")
+    return search
+
+@app.delete("/saved-searches/{search_id}")
+async def delete_saved_search(search_id: str):
+    """Stop tracking a saved search"""
+    if not saved_searches.remove(search_id):
+        raise HTTPException(status_code=404, detail=f"Saved search {search_id} not found")
+    return {"deleted": search_id}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Matching core shared by the FastAPI backend and the Azure Function
+Both hosts import PropertyMatcher, its indexes and the request/response
+models from here, so every matching feature behaves the same under either.
+"""
+
+from .admission import AdmissionController, AdmissionRejected, ClientDisconnected
+from .explain import MatchTrace
+from .facets import FacetIndex
+from .llm_backends import LLMBackend, create_backend_from_env
+from .matcher import PropertyMatcher
+from .runtime import (
+    ListingWriteDenied,
+    QueryTooBroad,
+    authorize_listing_write,
+    check_query_breadth,
+    get_admission_controller,
+    get_backend,
+    get_facet_index,
+    get_matcher,
+    get_saved_searches,
+    load_homes_data,
+)
+from .saved_searches import SavedSearchRegistry
+from .schemas import Home, MatchFilters, MatchResponse, MatchedHome, Range, UserPreferences
+
+__all__ = [
+    "AdmissionController",
+    "AdmissionRejected",
+    "ClientDisconnected",
+    "FacetIndex",
+    "Home",
+    "LLMBackend",
+    "ListingWriteDenied",
+    "MatchFilters",
+    "MatchResponse",
+    "MatchTrace",
+    "MatchedHome",
+    "PropertyMatcher",
+    "QueryTooBroad",
+    "Range",
+    "SavedSearchRegistry",
+    "UserPreferences",
+    "authorize_listing_write",
+    "check_query_breadth",
+    "create_backend_from_env",
+    "get_admission_controller",
+    "get_backend",
+    "get_facet_index",
+    "get_matcher",
+    "get_saved_searches",
+    "load_homes_data",
+]
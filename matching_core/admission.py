@@ -0,0 +1,193 @@
+"""
+Admission Control - bounded, prioritized work queue for match requests
+Keeps a fixed number of matcher calls in flight, queues the rest by priority
+class, and rejects quickly (with a Retry-After hint) once the queue is full
+or a request has waited too long, instead of letting every request's latency
+collapse under a spike.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .stats import percentile
+
+
+class AdmissionRejected(Exception):
+    """Request was not admitted; maps to an HTTP 429/503 with Retry-After"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """Client went away while the request was queued; the work was shed"""
+
+
+class AdmissionController:
+    """
+    In-process admission controller for blocking matcher calls
+
+    Priority classes are served strictly in order (interactive before batch);
+    within a class, first come first served.
+
+    Args:
+        max_concurrency: Matcher calls allowed in flight (also the worker pool size)
+        max_queue: Queue depth per priority class; beyond it requests get 429
+        max_wait: Seconds a request may wait for a slot before it gets 503
+    """
+
+    PRIORITIES = ("interactive", "batch")
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        max_queue: Optional[Dict[str, int]] = None,
+        max_wait: float = 10.0
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue or {"interactive": 64, "batch": 16}
+        self.max_wait = max_wait
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="match-worker"
+        )
+        self._active = 0
+        self._waiters: list = []
+        self._queued = {priority: 0 for priority in self.PRIORITIES}
+        self._seq = itertools.count()
+
+        # Exponentially weighted service time, for Retry-After estimates
+        self._service_time = 1.0
+        self._counters = {
+            "admitted": 0,
+            "completed": 0,
+            "rejected_queue_full": 0,
+            "rejected_wait_timeout": 0,
+            "shed_disconnected": 0
+        }
+        self._queue_waits = {priority: deque(maxlen=1024) for priority in self.PRIORITIES}
+
+    def _retry_after(self) -> int:
+        queued = sum(self._queued.values())
+        return max(1, math.ceil(self._service_time * (queued + 1) / self.max_concurrency))
+
+    async def _acquire(self, priority: str) -> bool:
+        """Take a slot, queueing if needed; returns True if the request was queued"""
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return False
+
+        if self._queued[priority] >= self.max_queue[priority]:
+            self._counters["rejected_queue_full"] += 1
+            raise AdmissionRejected(429, f"{priority} queue is full", self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (self.PRIORITIES.index(priority), next(self._seq), waiter))
+        self._queued[priority] += 1
+        try:
+            # The slot is handed over by _release(), so _active is unchanged on wake-up
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self._counters["rejected_wait_timeout"] += 1
+            raise AdmissionRejected(503, "server saturated", self._retry_after())
+        except BaseException:
+            # Cancelled after the slot was handed over: pass it on instead of leaking it
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            self._queued[priority] -= 1
+        return True
+
+    def _release(self):
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+    async def run(
+        self,
+        priority: str,
+        func: Callable[..., Any],
+        *args: Any,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+        **kwargs: Any
+    ) -> Tuple[Any, float]:
+        """
+        Run a blocking call once admitted
+
+        Args:
+            priority: 'interactive' or 'batch'
+            func: Blocking callable, run on the controller's worker pool
+            is_disconnected: Async check (e.g. Request.is_disconnected); queued
+                             requests whose client is gone are shed unrun
+
+        Returns:
+            (func's result, milliseconds spent waiting in the queue)
+
+        Raises:
+            AdmissionRejected: Queue full (429) or waited past max_wait (503)
+            ClientDisconnected: Client left while the request was queued
+        """
+        if priority not in self.PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'. Expected one of: {', '.join(self.PRIORITIES)}")
+
+        queued_at = time.perf_counter()
+        was_queued = await self._acquire(priority)
+        wait_ms = (time.perf_counter() - queued_at) * 1000
+        self._queue_waits[priority].append(wait_ms)
+
+        try:
+            if was_queued and is_disconnected is not None and await is_disconnected():
+                self._counters["shed_disconnected"] += 1
+                raise ClientDisconnected()
+
+            self._counters["admitted"] += 1
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+            elapsed = time.perf_counter() - started
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self._counters["completed"] += 1
+            return result, wait_ms
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load, counters and queue wait percentiles per class"""
+        queue_wait_ms = {}
+        for priority, waits in self._queue_waits.items():
+            ordered = sorted(waits)
+            if ordered:
+                queue_wait_ms[priority] = {
+                    "samples": len(ordered),
+                    "p50": round(percentile(ordered, 0.5), 2),
+                    "p95": round(percentile(ordered, 0.95), 2),
+                    "max": round(ordered[-1], 2)
+                }
+            else:
+                queue_wait_ms[priority] = {"samples": 0}
+
+        return {
+            "in_flight": self._active,
+            "max_concurrency": self.max_concurrency,
+            "queued": dict(self._queued),
+            "max_queue": dict(self.max_queue),
+            "service_time_s": round(self._service_time, 3),
+            "counters": dict(self._counters),
+            "queue_wait_ms": queue_wait_ms
+        }
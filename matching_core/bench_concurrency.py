@@ -0,0 +1,173 @@
+"""
+Concurrency stress benchmark for PropertyMatcher
+Runs find_matches from an increasing number of threads against one shared
+matcher in its default configuration, deduplication included (as a warm
+Functions instance or a FastAPI worker runs it), with the stand-in LLM and a
+background writer upserting listings, and reports throughput and latency per
+concurrency level.
+
+Usage:
+    python -m matching_core.bench_concurrency --listings 2000 --latency-ms 200
+    python -m matching_core.bench_concurrency --threads 1,4,16 --writes-per-sec 50
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .filters import matches_listing
+from .llm_backends import StandInBackend
+from .matcher import PropertyMatcher
+from .runtime import load_homes_data
+from .stats import percentile
+
+SAMPLE_PREFERENCES = [
+    {"home_type": "single-family", "budget": 900000, "amenities": ["pool", "park"],
+     "custom_needs": "Need a home office and large backyard", "filters": None},
+    {"home_type": "condo", "budget": 600000, "amenities": ["gym"], "custom_needs": "",
+     "filters": {"bedrooms": {"min": 2}}},
+    {"home_type": "any", "budget": 1200000, "amenities": ["pool", "gym"],
+     "custom_needs": "Love golf", "filters": {"sq_ft": {"min": 1500, "max": 3500}}},
+]
+
+
+def synthetic_listings(count: int, seed: int = 7, relist_rate: float = 0.05):
+    """
+    Build a larger catalogue from the sample homes
+
+    Each listing gets its own price, size, rooms and description, so it is
+    a distinct property to the deduper; `relist_rate` of them are relistings
+    of an earlier one at a slightly different price.
+    """
+    rng = random.Random(seed)
+    base = load_homes_data(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    words = sorted({word for home in base for word in home["description"].lower().split()})
+    homes = []
+    for i in range(count):
+        if homes and rng.random() < relist_rate:
+            home = dict(rng.choice(homes))
+            home["price"] = int(home["price"] * rng.uniform(0.97, 1.03))
+        else:
+            home = dict(rng.choice(base))
+            home["price"] = rng.randrange(150000, 1500000, 1000)
+            home["sq_ft"] = rng.randrange(600, 5000, 10)
+            home["bedrooms"] = rng.randint(1, 6)
+            home["description"] = " ".join(rng.choice(words) for _ in range(30))
+        home["id"] = 100000 + i
+        homes.append(home)
+    return homes
+
+
+def run_level(matcher: PropertyMatcher, threads: int, requests: int, writes_per_sec: float):
+    """Issue `requests` find_matches calls from `threads` threads; returns figures"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    stop = threading.Event()
+    writes = [0]
+
+    def writer():
+        rng = random.Random(threads)
+        while not stop.wait(1.0 / writes_per_sec):
+            home = dict(rng.choice(matcher.homes))
+            home["price"] = rng.randrange(150000, 1500000, 1000)
+            matcher.upsert_home(home)
+            writes[0] += 1
+
+    def invoke(i):
+        prefs = SAMPLE_PREFERENCES[i % len(SAMPLE_PREFERENCES)]
+        started = time.perf_counter()
+        try:
+            matches = matcher.find_matches(**prefs)
+            # Every result must satisfy the hard constraints of some snapshot
+            for home in matches:
+                if not matches_listing(home, prefs["home_type"], prefs["budget"], prefs["filters"]):
+                    raise AssertionError(f"home {home['id']} violates the request's filters")
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+            return
+        with lock:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    writer_thread = None
+    if writes_per_sec > 0:
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(invoke, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    if writer_thread is not None:
+        writer_thread.join()
+
+    latencies.sort()
+    return {
+        "threads": threads,
+        "requests": requests,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": percentile(latencies, 0.95),
+        "writes": writes[0],
+        "errors": errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency stress benchmark for PropertyMatcher")
+    parser.add_argument("--listings", type=int, default=2000)
+    parser.add_argument("--threads", default="1,2,4,8,16,32",
+                        help="comma-separated concurrency levels")
+    parser.add_argument("--requests-per-thread", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200.0,
+                        help="stand-in LLM latency per call")
+    parser.add_argument("--llm-workers", type=int, default=16)
+    parser.add_argument("--writes-per-sec", type=float, default=20.0,
+                        help="background listing upserts during each level (0 = none)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    matcher = PropertyMatcher(
+        synthetic_listings(args.listings),
+        backend=StandInBackend(latency_ms=args.latency_ms, tokens_per_second=0),
+        max_llm_workers=args.llm_workers
+    )
+
+    results = []
+    try:
+        for threads in [int(level) for level in args.threads.split(",")]:
+            results.append(run_level(
+                matcher, threads, threads * args.requests_per_thread, args.writes_per_sec
+            ))
+    finally:
+        matcher.close()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    baseline = results[0]["throughput"] or 1.0
+    print(f"listings: {args.listings} ({matcher.index.size} unique), LLM latency: {args.latency_ms:.0f} ms, "
+          f"LLM workers: {args.llm_workers}, writes/s: {args.writes_per_sec:g}")
+    print(f"{'threads':>7} {'req/s':>8} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'writes':>7} {'errors':>7}")
+    for result in results:
+        print(
+            f"{result['threads']:>7} {result['throughput']:>8.1f} "
+            f"{result['throughput'] / baseline:>7.1f}x {result['p50_ms']:>8.0f} "
+            f"{result['p95_ms']:>8.0f} {result['writes']:>7} {len(result['errors']):>7}"
+        )
+    for result in results:
+        for error in result["errors"][:3]:
+            print(f"  [{result['threads']} threads] {error}")
+
+
+if __name__ == "__main__":
+    main()
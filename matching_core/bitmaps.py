@@ -0,0 +1,24 @@
+"""
+Bitmap helpers shared by the listing indexes
+A bitmap is a plain Python int with one bit per listing slot, which keeps
+intersections and counts in C (&, |, int.bit_count).
+"""
+
+from typing import Iterable, Iterator
+
+
+def bitmap_of(slots: Iterable[int], size: int) -> int:
+    """Build a bitmap from slot positions in O(len(slots) + size / 8)"""
+    buffer = bytearray((size + 7) // 8)
+    for slot in slots:
+        buffer[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_slots(bitmap: int) -> Iterator[int]:
+    """Yield the positions of set bits, lowest first"""
+    bits = bin(bitmap)[:1:-1]
+    slot = bits.find("1")
+    while slot != -1:
+        yield slot
+        slot = bits.find("1", slot + 1)
@@ -0,0 +1,78 @@
+"""
+Concurrency helpers - striped locks and caches for multithreaded matchers
+A single lock around a shared cache serializes every request that touches
+it; striping spreads keys over independent locks so unrelated lookups never
+wait on each other, while concurrent misses on the same key compute it once.
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Tuple
+
+
+class StripedLock:
+    """
+    Fixed set of locks, selected by key hash
+
+    Args:
+        stripes: Number of independent locks
+    """
+
+    def __init__(self, stripes: int = 16):
+        self._locks: List[threading.Lock] = [threading.Lock() for _ in range(stripes)]
+
+    def index_for(self, key: Hashable) -> int:
+        return hash(key) % len(self._locks)
+
+    def for_key(self, key: Hashable) -> threading.Lock:
+        """The lock guarding `key`"""
+        return self._locks[self.index_for(key)]
+
+
+class StripedCache:
+    """
+    Bounded LRU cache sharded over striped locks
+
+    Each stripe is its own small LRU, so the cache holds at most about
+    `max_entries` values and a lookup only contends with keys on its stripe.
+
+    Args:
+        max_entries: Approximate capacity across all stripes
+        stripes: Number of independently locked shards
+    """
+
+    def __init__(self, max_entries: int = 256, stripes: int = 16):
+        self._locks = StripedLock(stripes)
+        self._shards: List[OrderedDict] = [OrderedDict() for _ in range(stripes)]
+        self._per_shard = max(1, max_entries // stripes)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Cached value for `key`, computing it on a miss
+
+        Holds the key's stripe lock while computing, so threads that miss on
+        the same key at the same time wait for one computation instead of
+        repeating it. `compute` must not touch this cache.
+
+        Returns:
+            (value, whether it was already cached)
+        """
+        stripe = self._locks.index_for(key)
+        with self._locks.for_key(key):
+            shard = self._shards[stripe]
+            if key in shard:
+                shard.move_to_end(key)
+                return shard[key], True
+            value = compute()
+            self._put_locked(shard, key, value)
+            return value, False
+
+    def _put_locked(self, shard: OrderedDict, key: Hashable, value: Any):
+        shard[key] = value
+        shard.move_to_end(key)
+        while len(shard) > self._per_shard:
+            shard.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._locks.for_key(key):
+            return key in self._shards[self._locks.index_for(key)]
@@ -0,0 +1,293 @@
+"""
+Listing Deduplication - collapse near-duplicate MLS listings
+Relistings, multi-agent copies and price edits of the same property are
+clustered under one canonical listing, so matching and the LLM prompt only
+see each property once.
+
+Candidates are found with MinHash/LSH over word shingles of name,
+description and location, then confirmed with exact shingle Jaccard and
+numeric attribute matching.
+"""
+
+import hashlib
+import random
+import re
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def shingles(home: Dict[str, Any], size: int = 3) -> frozenset:
+    """Word n-grams of the listing's name, description and location"""
+    text = " ".join([home.get("name", ""), home.get("description", ""), home.get("location", "")])
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < size:
+        return frozenset(tokens)
+    return frozenset(" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class ListingDeduper:
+    """
+    Incremental near-duplicate clustering for listings
+
+    Each cluster's canonical listing is its earliest-added member. Removing
+    a canonical listing promotes the next oldest member. Updating a listing
+    keeps its original place in that order.
+
+    Writers serialize on a lock; lookups do not take it. Cluster membership
+    is published as immutable tuples that writers replace whole (the new
+    cluster before the old one is dropped), and MinHash signatures are
+    computed before the lock is taken, so a read never waits on a write.
+
+    Args:
+        num_perm: MinHash signature length
+        bands: LSH bands (num_perm must be divisible by bands)
+        threshold: Minimum shingle Jaccard similarity for a duplicate
+        price_tolerance: Max relative price difference (covers price edits)
+        sq_ft_tolerance: Max relative square footage difference
+    """
+
+    def __init__(
+        self,
+        num_perm: int = 32,
+        bands: int = 8,
+        threshold: float = 0.7,
+        price_tolerance: float = 0.15,
+        sq_ft_tolerance: float = 0.05,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.price_tolerance = price_tolerance
+        self.sq_ft_tolerance = sq_ft_tolerance
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+        self._lock = threading.RLock()
+        self._homes: Dict[Any, Dict[str, Any]] = {}
+        self._shingles: Dict[Any, frozenset] = {}
+        self._band_keys: Dict[Any, List[tuple]] = {}
+        self._buckets: Dict[tuple, Set[Any]] = {}
+        self._canonical_of: Dict[Any, Any] = {}
+        self._members: Dict[Any, Tuple[Any, ...]] = {}
+        self._added_seq: Dict[Any, int] = {}
+        self._next_seq = 0
+
+    # ------------------------------------------------------------------
+    # Signatures
+    # ------------------------------------------------------------------
+
+    def _signature(self, shingle_set: frozenset) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+            for s in shingle_set
+        ] or [0]
+        return [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        ]
+
+    def _bands_of(self, signature: List[int]) -> List[tuple]:
+        return [
+            (band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def _fingerprint(self, home: Dict[str, Any]) -> Tuple[frozenset, List[tuple]]:
+        home_shingles = shingles(home)
+        return home_shingles, self._bands_of(self._signature(home_shingles))
+
+    def _is_duplicate(self, home: Dict[str, Any], other: Dict[str, Any], home_shingles: frozenset) -> bool:
+        if home["type"] != other["type"]:
+            return False
+        if home["bedrooms"] != other["bedrooms"] or home["bathrooms"] != other["bathrooms"]:
+            return False
+        if abs(home["sq_ft"] - other["sq_ft"]) > self.sq_ft_tolerance * max(home["sq_ft"], other["sq_ft"]):
+            return False
+        if abs(home["price"] - other["price"]) > self.price_tolerance * max(home["price"], other["price"]):
+            return False
+        return jaccard(home_shingles, self._shingles[other["id"]]) >= self.threshold
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def add(self, home: Dict[str, Any]) -> Tuple[Any, List[Any]]:
+        """
+        Add a listing and attach it to its duplicate cluster
+
+        The listing must not already be present (use update() to change one).
+
+        Returns:
+            (canonical id of the listing's cluster, ids of listings that were
+            canonical before and no longer are because clusters merged)
+        """
+        home_shingles, band_keys = self._fingerprint(home)
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            return self._add_locked(home, seq, home_shingles, band_keys)
+
+    def update(self, home: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[Any]]:
+        """
+        Replace a listing with an edited version (e.g. a price change)
+
+        The listing keeps its original add order, so an edit never demotes a
+        canonical listing in favour of a newer relisting. It is re-clustered
+        only when it no longer matches any other member of its cluster (or,
+        alone in its cluster, in case it now matches another one).
+
+        Returns:
+            (listing promoted to canonical because this one left its cluster,
+            ids of listings that were canonical before and no longer are)
+        """
+        home_shingles, band_keys = self._fingerprint(home)
+        with self._lock:
+            home_id = home["id"]
+            if home_id not in self._homes:
+                seq = self._next_seq
+                self._next_seq += 1
+                return None, self._add_locked(home, seq, home_shingles, band_keys)[1]
+
+            canonical = self._canonical_of[home_id]
+            others = [member for member in self._members[canonical] if member != home_id]
+            if any(self._is_duplicate(home, self._homes[other], home_shingles) for other in others):
+                self._unregister(home_id)
+                self._register(home, home_shingles, band_keys)
+                return None, []
+
+            seq = self._added_seq[home_id]
+            promoted = self.remove(home_id)
+            _, demoted = self._add_locked(home, seq, home_shingles, band_keys)
+            return promoted, demoted
+
+    def _add_locked(
+        self,
+        home: Dict[str, Any],
+        seq: int,
+        home_shingles: frozenset,
+        band_keys: List[tuple]
+    ) -> Tuple[Any, List[Any]]:
+        home_id = home["id"]
+        candidates: Set[Any] = set()
+        for key in band_keys:
+            candidates |= self._buckets.get(key, set())
+
+        clusters = {
+            self._canonical_of[other_id]
+            for other_id in candidates
+            if self._is_duplicate(home, self._homes[other_id], home_shingles)
+        }
+
+        self._register(home, home_shingles, band_keys)
+        self._added_seq[home_id] = seq
+        if not clusters:
+            self._members[home_id] = (home_id,)
+            self._canonical_of[home_id] = home_id
+            return home_id, []
+
+        # Merge every matched cluster and this listing under the oldest of
+        # them, which is the listing itself when an edit kept an older place
+        # than the clusters it now matches. Publish the merged cluster first,
+        # then retire the absorbed ones.
+        canonical = min(clusters | {home_id}, key=lambda listing_id: self._added_seq[listing_id])
+        absorbed = [cluster for cluster in clusters if cluster != canonical]
+        members = [home_id]
+        for cluster in clusters:
+            members.extend(self._members.get(cluster, ()))
+        self._members[canonical] = tuple(sorted(members, key=lambda member: self._added_seq[member]))
+        for member in members:
+            self._canonical_of[member] = canonical
+        for other in absorbed:
+            del self._members[other]
+        return canonical, absorbed
+
+    def _register(self, home: Dict[str, Any], home_shingles: frozenset, band_keys: List[tuple]):
+        home_id = home["id"]
+        self._homes[home_id] = home
+        self._shingles[home_id] = home_shingles
+        self._band_keys[home_id] = band_keys
+        for key in band_keys:
+            self._buckets.setdefault(key, set()).add(home_id)
+
+    def _unregister(self, home_id: Any):
+        for key in self._band_keys.pop(home_id):
+            bucket = self._buckets[key]
+            bucket.discard(home_id)
+            if not bucket:
+                del self._buckets[key]
+        del self._homes[home_id]
+        del self._shingles[home_id]
+
+    def remove(self, home_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Remove a listing
+
+        Returns:
+            The listing promoted to canonical if the removed one was canonical
+            and its cluster still has members, otherwise None
+        """
+        with self._lock:
+            if home_id not in self._homes:
+                return None
+
+            self._unregister(home_id)
+            del self._added_seq[home_id]
+
+            canonical = self._canonical_of.pop(home_id)
+            members = tuple(member for member in self._members[canonical] if member != home_id)
+            if not members:
+                del self._members[canonical]
+                return None
+
+            new_canonical = members[0]
+            self._members[new_canonical] = members
+            for member in members:
+                self._canonical_of[member] = new_canonical
+            if new_canonical != canonical:
+                del self._members[canonical]
+            return self._homes[new_canonical] if canonical == home_id else None
+
+    def collapse(self, homes_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add every listing and return the canonical ones, in input order"""
+        for home in homes_data:
+            self.add(home)
+        return [home for home in homes_data if self._canonical_of.get(home["id"]) == home["id"]]
+
+    # ------------------------------------------------------------------
+    # Lookups (lock-free: single dict reads of published values)
+    # ------------------------------------------------------------------
+
+    def is_canonical(self, home_id: Any) -> bool:
+        return self._canonical_of.get(home_id) == home_id
+
+    def canonical_of(self, home_id: Any) -> Optional[Any]:
+        return self._canonical_of.get(home_id)
+
+    def variants(self, canonical_id: Any) -> List[Any]:
+        """Ids of the other listings clustered under a canonical listing"""
+        return [member for member in self._members.get(canonical_id, ()) if member != canonical_id]
+
+    def get(self, home_id: Any) -> Optional[Dict[str, Any]]:
+        return self._homes.get(home_id)
+
+    @property
+    def cluster_count(self) -> int:
+        return len(self._members)
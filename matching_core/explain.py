@@ -0,0 +1,67 @@
+"""
+Match Tracing - execution plan and per-stage figures for /match?explain=true
+PropertyMatcher records what each stage did (filters, prompt, LLM call,
+parsing) into a MatchTrace, which the API can return alongside the results.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+
+class MatchTrace:
+    """
+    Collects the execution plan and actual figures for one match request
+
+    Attributes:
+        estimate: Pre-execution cost estimate (PropertyMatcher.estimate_cost)
+        plan: One entry per filter predicate, in execution order
+        stages: Timed pipeline stages with their own figures
+        tokens: Estimated vs. actual prompt/completion tokens
+        cache: Hit/miss counters per cache
+    """
+
+    def __init__(self):
+        self.estimate: Optional[Dict[str, Any]] = None
+        self.plan: List[Dict[str, Any]] = []
+        self.stages: List[Dict[str, Any]] = []
+        self.tokens: Dict[str, Any] = {}
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self.notes: List[str] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Time a pipeline stage; the yielded dict collects its figures
+
+        Example:
+            with trace.stage("filter") as stage:
+                stage["candidates"] = len(homes)
+        """
+        record = {"stage": name}
+        started = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.stages.append(record)
+
+    def count_cache(self, cache: str, hit: bool):
+        """Record one cache lookup"""
+        counters = self.cache.setdefault(cache, {"hits": 0, "misses": 0})
+        counters["hits" if hit else "misses"] += 1
+
+    def note(self, message: str):
+        self.notes.append(message)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "estimate": self.estimate,
+            "plan": self.plan,
+            "stages": self.stages,
+            "tokens": self.tokens,
+            "cache": self.cache,
+            "notes": self.notes,
+            "total_ms": round((time.perf_counter() - self._started) * 1000, 3)
+        }
@@ -0,0 +1,456 @@
+"""
+Structured Filters - hard constraints pushed down before scoring
+Compiles type, price/bedroom/bathroom/sq_ft ranges and required amenities
+into a predicate plan evaluated over columnar indexes, so only listings that
+satisfy every hard constraint reach the LLM prompt.
+"""
+
+import bisect
+import json
+import threading
+from typing import List, Dict, Any, Optional
+
+from .bitmaps import bitmap_of, iter_slots
+from .concurrency import StripedCache
+
+RANGE_FIELDS = ("price", "bedrooms", "bathrooms", "sq_ft")
+
+
+class IndexSnapshot:
+    """
+    Immutable point-in-time view of a ListingIndex
+
+    Nothing in a published snapshot is mutated again, so any number of
+    threads can read one without locking. Materialized predicate bitmaps are
+    cached per snapshot in a striped cache, which makes invalidation on
+    writes implicit: the next write publishes a new snapshot with an empty
+    cache.
+    """
+
+    MAX_CACHED_BITMAPS = 256
+
+    def __init__(
+        self,
+        homes: List[Optional[Dict[str, Any]]],
+        columns: Dict[str, List[Any]],
+        sorted_columns: Dict[str, List[tuple]],
+        types: Dict[str, int],
+        amenities: Dict[str, int],
+        amenity_sets: List[frozenset],
+        all_slots: int,
+        size: int,
+        total_serialized_chars: int
+    ):
+        self.homes = homes
+        self.columns = columns
+        self.sorted = sorted_columns
+        self.types = types
+        self.amenities = amenities
+        self.amenity_sets = amenity_sets
+        self.all = all_slots
+        self.size = size
+        self.capacity = len(homes)
+        self.total_serialized_chars = total_serialized_chars
+        self.bitmaps = StripedCache(self.MAX_CACHED_BITMAPS)
+
+    def range_bounds(self, field: str, low: Optional[float], high: Optional[float]) -> tuple:
+        """Start/end positions of [low, high] in the sorted index of `field`"""
+        entries = self.sorted[field]
+        start = 0 if low is None else bisect.bisect_left(entries, (low, -1))
+        end = len(entries) if high is None else bisect.bisect_right(entries, (high, float("inf")))
+        return start, max(start, end)
+
+
+class ListingIndex:
+    """
+    Columnar view of the listings with sorted and posting-list indexes
+
+    - Numeric fields keep a column (slot -> value) and a sorted list of
+      (value, slot) pairs, so range counts and scans are bisections.
+    - Type and amenities keep posting bitmaps.
+
+    Updated incrementally through on_listing_upserted()/on_listing_removed().
+    Writers are serialized by `lock` and, after each change, publish a fresh
+    IndexSnapshot (copy-on-write, O(listings) per write). Readers take
+    `snapshot` once and never lock.
+    """
+
+    def __init__(self, homes_data: Optional[List[Dict[str, Any]]] = None):
+        self.lock = threading.RLock()
+        self.homes: List[Optional[Dict[str, Any]]] = []
+        self.columns: Dict[str, List[Any]] = {field: [] for field in RANGE_FIELDS}
+        self.sorted: Dict[str, List[tuple]] = {field: [] for field in RANGE_FIELDS}
+        self.types: Dict[str, int] = {}
+        self.amenities: Dict[str, int] = {}
+        self.amenity_sets: List[frozenset] = []
+        self.all = 0
+
+        # Serialized size of the listings, used for prompt token estimates
+        self.serialized_chars: List[int] = []
+        self.total_serialized_chars = 0
+
+        self._slots: Dict[Any, int] = {}
+        self._free_slots: List[int] = []
+
+        with self.lock:
+            for home in homes_data or []:
+                self._add_locked(home)
+            self._publish()
+
+    @property
+    def size(self) -> int:
+        """Number of indexed listings"""
+        return self.snapshot.size
+
+    @property
+    def capacity(self) -> int:
+        """Number of slots, including free ones"""
+        return self.snapshot.capacity
+
+    def _publish(self):
+        # A single attribute store, so readers see either the old or the new snapshot
+        self.snapshot = IndexSnapshot(
+            homes=list(self.homes),
+            columns={field: list(values) for field, values in self.columns.items()},
+            sorted_columns={field: list(entries) for field, entries in self.sorted.items()},
+            types=dict(self.types),
+            amenities=dict(self.amenities),
+            amenity_sets=list(self.amenity_sets),
+            all_slots=self.all,
+            size=len(self._slots),
+            total_serialized_chars=self.total_serialized_chars
+        )
+
+    def add(self, home: Dict[str, Any]):
+        """Index a listing (replacing any existing entry with the same id)"""
+        with self.lock:
+            self._add_locked(home)
+            self._publish()
+
+    def _add_locked(self, home: Dict[str, Any]):
+        if home["id"] in self._slots:
+            self._remove_locked(home["id"])
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = len(self.homes)
+            self.homes.append(None)
+            self.amenity_sets.append(frozenset())
+            self.serialized_chars.append(0)
+            for field in RANGE_FIELDS:
+                self.columns[field].append(None)
+
+        bit = 1 << slot
+        self._slots[home["id"]] = slot
+        self.homes[slot] = home
+        self.all |= bit
+
+        chars = len(json.dumps(home, indent=2))
+        self.serialized_chars[slot] = chars
+        self.total_serialized_chars += chars
+
+        for field in RANGE_FIELDS:
+            self.columns[field][slot] = home[field]
+            bisect.insort(self.sorted[field], (home[field], slot))
+
+        self.types[home["type"]] = self.types.get(home["type"], 0) | bit
+
+        amenities = frozenset(home.get("amenities", []))
+        self.amenity_sets[slot] = amenities
+        for amenity in amenities:
+            self.amenities[amenity] = self.amenities.get(amenity, 0) | bit
+
+    def remove(self, home_id: Any) -> bool:
+        """Drop a listing from the index; returns False if it was not indexed"""
+        with self.lock:
+            if home_id not in self._slots:
+                return False
+            self._remove_locked(home_id)
+            self._publish()
+            return True
+
+    def _remove_locked(self, home_id: Any):
+        slot = self._slots.pop(home_id)
+        home = self.homes[slot]
+        mask = ~(1 << slot)
+        self.all &= mask
+
+        for field in RANGE_FIELDS:
+            entries = self.sorted[field]
+            del entries[bisect.bisect_left(entries, (self.columns[field][slot], slot))]
+            self.columns[field][slot] = None
+
+        for postings, keys in ((self.types, [home["type"]]), (self.amenities, self.amenity_sets[slot])):
+            for key in keys:
+                remaining = postings[key] & mask
+                if remaining:
+                    postings[key] = remaining
+                else:
+                    del postings[key]
+
+        self.total_serialized_chars -= self.serialized_chars[slot]
+        self.serialized_chars[slot] = 0
+        self.homes[slot] = None
+        self.amenity_sets[slot] = frozenset()
+        self._free_slots.append(slot)
+
+    def on_listing_upserted(self, home: Dict[str, Any], previous: Optional[Dict[str, Any]]):
+        self.add(home)
+
+    def on_listing_removed(self, home: Dict[str, Any]):
+        self.remove(home["id"])
+
+
+class Predicate:
+    """A single hard constraint that can be answered from an IndexSnapshot"""
+
+    def estimate(self, snapshot: IndexSnapshot) -> int:
+        """Number of listings this predicate alone would keep"""
+        raise NotImplementedError
+
+    def bitmap(self, snapshot: IndexSnapshot) -> int:
+        """Index scan: every matching slot as a bitmap"""
+        raise NotImplementedError
+
+    def scan_cost(self, snapshot: IndexSnapshot, estimate: int) -> int:
+        """Slots touched by bitmap(); posting lookups are free"""
+        return 0
+
+    def access_path(self, snapshot: IndexSnapshot) -> str:
+        """How bitmap() will be answered, for explain output"""
+        return "posting_list"
+
+    def matches(self, snapshot: IndexSnapshot, slot: int) -> bool:
+        """Residual check of one slot against the columns"""
+        raise NotImplementedError
+
+
+class TypePredicate(Predicate):
+    def __init__(self, home_type: str):
+        self.home_type = home_type
+
+    def estimate(self, snapshot):
+        return snapshot.types.get(self.home_type, 0).bit_count()
+
+    def bitmap(self, snapshot):
+        return snapshot.types.get(self.home_type, 0)
+
+    def matches(self, snapshot, slot):
+        return snapshot.homes[slot]["type"] == self.home_type
+
+    def __repr__(self):
+        return f"type == {self.home_type!r}"
+
+
+class AmenityPredicate(Predicate):
+    def __init__(self, amenity: str):
+        self.amenity = amenity
+
+    def estimate(self, snapshot):
+        return snapshot.amenities.get(self.amenity, 0).bit_count()
+
+    def bitmap(self, snapshot):
+        return snapshot.amenities.get(self.amenity, 0)
+
+    def matches(self, snapshot, slot):
+        return self.amenity in snapshot.amenity_sets[slot]
+
+    def __repr__(self):
+        return f"amenities contains {self.amenity!r}"
+
+
+class RangePredicate(Predicate):
+    def __init__(self, field: str, low: Optional[float], high: Optional[float]):
+        self.field = field
+        self.low = low
+        self.high = high
+
+    def estimate(self, snapshot):
+        start, end = snapshot.range_bounds(self.field, self.low, self.high)
+        return end - start
+
+    def _key(self):
+        return ("range", self.field, self.low, self.high)
+
+    def scan_cost(self, snapshot, estimate):
+        if self._key() in snapshot.bitmaps:
+            return 0
+        return min(estimate, snapshot.size - estimate)
+
+    def access_path(self, snapshot):
+        if self._key() in snapshot.bitmaps:
+            return "cached_range_bitmap"
+        return "sorted_range_scan"
+
+    def bitmap(self, snapshot):
+        # Concurrent requests for the same cold range materialize it once
+        bitmap, _ = snapshot.bitmaps.get_or_compute(self._key(), lambda: self._materialize(snapshot))
+        return bitmap
+
+    def _materialize(self, snapshot):
+        start, end = snapshot.range_bounds(self.field, self.low, self.high)
+        entries = snapshot.sorted[self.field]
+        if (end - start) * 2 <= snapshot.size:
+            bitmap = bitmap_of((slot for _, slot in entries[start:end]), snapshot.capacity)
+        else:
+            # Wide range: materialize the (smaller) complement instead
+            outside = [slot for _, slot in entries[:start]]
+            outside.extend(slot for _, slot in entries[end:])
+            bitmap = snapshot.all & ~bitmap_of(outside, snapshot.capacity)
+        return bitmap
+
+    def matches(self, snapshot, slot):
+        value = snapshot.columns[self.field][slot]
+        if self.low is not None and value < self.low:
+            return False
+        if self.high is not None and value > self.high:
+            return False
+        return True
+
+    def __repr__(self):
+        low = "-inf" if self.low is None else self.low
+        high = "inf" if self.high is None else self.high
+        return f"{self.field} in [{low}, {high}]"
+
+
+class FilterPlan:
+    """
+    Ordered predicate plan over an IndexSnapshot
+
+    Predicates run most-selective first. Each later predicate is either
+    intersected as an index scan or, when the surviving candidates are
+    cheaper to check one by one than the scan is to materialize, applied
+    as a residual check on those candidates only.
+    """
+
+    # Relative cost of checking one candidate vs. materializing one slot
+    RESIDUAL_COST = 3
+
+    def __init__(self, predicates: List[Predicate]):
+        self.predicates = predicates
+
+    def estimate(self, snapshot: IndexSnapshot) -> int:
+        """
+        Pre-execution candidate estimate
+
+        Uses each predicate's exact individual count and assumes the
+        predicates are independent, so nothing is materialized.
+        """
+        if snapshot.size == 0:
+            return 0
+        selectivity = 1.0
+        for predicate in self.predicates:
+            selectivity *= predicate.estimate(snapshot) / snapshot.size
+        return round(snapshot.size * selectivity)
+
+    def execute(self, snapshot: IndexSnapshot, trace: Optional[Any] = None) -> List[Dict[str, Any]]:
+        """
+        Return matching listings in slot order
+
+        Args:
+            snapshot: Index snapshot to evaluate against (ListingIndex.snapshot)
+            trace: Optional MatchTrace; receives one plan entry per predicate
+        """
+        ordered = sorted(
+            ((predicate.estimate(snapshot), predicate) for predicate in self.predicates),
+            key=lambda item: item[0]
+        )
+
+        candidates = snapshot.all
+        count = snapshot.size
+        for estimate, predicate in ordered:
+            if count == 0:
+                break
+            candidates_before = count
+            if count * self.RESIDUAL_COST < predicate.scan_cost(snapshot, estimate):
+                access = "residual_check"
+                survivors = [
+                    slot for slot in iter_slots(candidates)
+                    if predicate.matches(snapshot, slot)
+                ]
+                candidates = bitmap_of(survivors, snapshot.capacity)
+            else:
+                access = predicate.access_path(snapshot)
+                candidates &= predicate.bitmap(snapshot)
+            count = candidates.bit_count()
+
+            if trace is not None:
+                if isinstance(predicate, RangePredicate) and access != "residual_check":
+                    trace.count_cache("range_bitmaps", access == "cached_range_bitmap")
+                trace.plan.append({
+                    "predicate": repr(predicate),
+                    "access": access,
+                    "matches_alone": estimate,
+                    "candidates_before": candidates_before,
+                    "candidates_after": count
+                })
+
+        return [snapshot.homes[slot] for slot in iter_slots(candidates)]
+
+    def __repr__(self):
+        return " AND ".join(repr(predicate) for predicate in self.predicates) or "TRUE"
+
+
+def compile_filters(
+    home_type: str,
+    budget: Optional[int],
+    filters: Optional[Dict[str, Any]] = None
+) -> FilterPlan:
+    """
+    Compile the legacy type/budget fields plus structured filters into a plan
+
+    Args:
+        home_type: Desired property type (or 'any')
+        budget: Maximum price; combined with filters['price']['max']
+        filters: Optional dict with 'price', 'bedrooms', 'bathrooms' and
+                 'sq_ft' ranges ({'min': x, 'max': y}, either bound optional)
+                 and 'required_amenities'
+
+    Returns:
+        FilterPlan ready to execute against an IndexSnapshot
+    """
+    filters = filters or {}
+    predicates: List[Predicate] = []
+
+    if home_type and home_type != 'any':
+        predicates.append(TypePredicate(home_type))
+
+    for field in RANGE_FIELDS:
+        bounds = filters.get(field) or {}
+        low = bounds.get("min")
+        high = bounds.get("max")
+        if field == "price" and budget is not None:
+            high = budget if high is None else min(high, budget)
+        if low is not None or high is not None:
+            predicates.append(RangePredicate(field, low, high))
+
+    for amenity in dict.fromkeys(filters.get("required_amenities") or []):
+        predicates.append(AmenityPredicate(amenity))
+
+    return FilterPlan(predicates)
+
+
+def matches_listing(
+    home: Dict[str, Any],
+    home_type: str,
+    budget: Optional[int],
+    filters: Optional[Dict[str, Any]] = None
+) -> bool:
+    """Check one listing against the same constraints compile_filters() plans"""
+    filters = filters or {}
+
+    if home_type and home_type != 'any' and home["type"] != home_type:
+        return False
+    if budget is not None and home["price"] > budget:
+        return False
+
+    for field in RANGE_FIELDS:
+        bounds = filters.get(field) or {}
+        if bounds.get("min") is not None and home[field] < bounds["min"]:
+            return False
+        if bounds.get("max") is not None and home[field] > bounds["max"]:
+            return False
+
+    amenities = set(home.get("amenities", []))
+    return all(amenity in amenities for amenity in filters.get("required_amenities") or [])
@@ -0,0 +1,422 @@
+"""
+LLM Backends - pluggable completion providers for PropertyMatcher
+Every backend speaks the shape of Anthropic's Messages API so the matcher
+does not care whether a completion came from Claude, the local stand-in,
+or a recording on disk.
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import List, Dict, Any, Optional
+
+
+class TextBlock:
+    """A single text content block, mirroring the Messages API"""
+
+    def __init__(self, text: str):
+        self.type = "text"
+        self.text = text
+
+
+class Usage:
+    """Token accounting for a single completion"""
+
+    def __init__(self, input_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+
+class Message:
+    """Minimal Messages API response object"""
+
+    def __init__(
+        self,
+        text: str,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        stop_reason: str = "end_turn",
+        message_id: Optional[str] = None
+    ):
+        self.id = message_id or f"msg_{uuid.uuid4().hex[:24]}"
+        self.type = "message"
+        self.role = "assistant"
+        self.model = model
+        self.content = [TextBlock(text)]
+        self.stop_reason = stop_reason
+        self.usage = Usage(input_tokens, output_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize using the Messages API wire format"""
+        return {
+            "id": self.id,
+            "type": self.type,
+            "role": self.role,
+            "model": self.model,
+            "content": [{"type": "text", "text": block.text} for block in self.content],
+            "stop_reason": self.stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": self.usage.input_tokens,
+                "output_tokens": self.usage.output_tokens
+            }
+        }
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English/JSON)"""
+    return max(1, len(text) // 4)
+
+
+def _prompt_text(messages: List[Dict[str, Any]]) -> str:
+    """Flatten message contents into a single string"""
+    parts = []
+    for message in messages:
+        content = message.get("content", "")
+        if isinstance(content, str):
+            parts.append(content)
+        else:
+            parts.extend(block.get("text", "") for block in content)
+    return "\n".join(parts)
+
+
+class LLMBackend:
+    """
+    Interface for completion providers used by PropertyMatcher
+
+    Subclasses implement create_message() and return an object exposing
+    `content[0].text` and `usage`, like anthropic.types.Message.
+    """
+
+    name = "base"
+
+    def create_message(
+        self,
+        model: str,
+        max_tokens: int,
+        temperature: float,
+        messages: List[Dict[str, Any]]
+    ) -> Any:
+        raise NotImplementedError
+
+
+class AnthropicBackend(LLMBackend):
+    """
+    Real Claude API calls through the official SDK
+
+    Honors ANTHROPIC_BASE_URL, so it can also be pointed at llm_standin.py,
+    and ANTHROPIC_TIMEOUT (seconds) for serverless hosts. The client, and
+    its connection pool, is safe to share across threads.
+    """
+
+    name = "anthropic"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        timeout: Optional[float] = None
+    ):
+        api_key = api_key or os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError(
+                "ANTHROPIC_API_KEY environment variable not set. "
+                "Get your API key from https://console.anthropic.com/"
+            )
+
+        import anthropic
+
+        kwargs = {"api_key": api_key}
+        if base_url:
+            kwargs["base_url"] = base_url
+        if timeout is None and os.environ.get("ANTHROPIC_TIMEOUT"):
+            timeout = float(os.environ["ANTHROPIC_TIMEOUT"])
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        self.client = anthropic.Anthropic(**kwargs)
+
+    def create_message(self, model, max_tokens, temperature, messages):
+        return self.client.messages.create(
+            model=model,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=messages
+        )
+
+
+class StandInBackend(LLMBackend):
+    """
+    Local stand-in for Claude with configurable latency and throughput
+
+    Produces deterministic, well-formed evaluation JSON for every property in
+    the prompt's AVAILABLE PROPERTIES section, so the full matching pipeline
+    runs without network access or API quota. Scores are a stable hash of
+    (prompt, id). Ids listed under ALSO SCORE are appended after the top 3.
+
+    Args:
+        latency_ms: Fixed time-to-first-token per request
+        tokens_per_second: Output throughput; 0 disables the generation delay
+        jitter: Relative random jitter applied to the total delay (0.1 = ±10%)
+    """
+
+    name = "standin"
+
+    _ID_PATTERN = re.compile(r'"id":\s*(\d+)')
+    _ALSO_SCORE_PATTERN = re.compile(r'^ALSO SCORE: (\[.*\])$', re.MULTILINE)
+    _PROPERTIES_HEADER = "AVAILABLE PROPERTIES:"
+    # JSON strings escape newlines, so this can't occur inside a listing
+    _PROPERTIES_END = "\nTASK:"
+
+    def __init__(
+        self,
+        latency_ms: float = 400.0,
+        tokens_per_second: float = 80.0,
+        jitter: float = 0.0
+    ):
+        self.latency_ms = latency_ms
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+
+    def create_message(self, model, max_tokens, temperature, messages):
+        prompt = _prompt_text(messages)
+        reply = self._generate_reply(prompt)
+
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = min(estimate_tokens(reply), max_tokens)
+
+        delay = self.latency_ms / 1000.0
+        if self.tokens_per_second > 0:
+            delay += output_tokens / self.tokens_per_second
+        if self.jitter:
+            delay *= 1.0 + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        return Message(reply, model, input_tokens, output_tokens)
+
+    def _candidate_ids(self, prompt: str) -> List[int]:
+        """
+        Property ids offered in the prompt, in order
+
+        Only the AVAILABLE PROPERTIES section is read, so ids in the prompt's
+        response example are never mistaken for candidates. Prompts without
+        that section fall back to every "id" in the text.
+        """
+        section = prompt
+        start = prompt.find(self._PROPERTIES_HEADER)
+        if start != -1:
+            start += len(self._PROPERTIES_HEADER)
+            end = prompt.find(self._PROPERTIES_END, start)
+            section = prompt[start:end if end != -1 else len(prompt)]
+
+        try:
+            homes = json.loads(section)
+            ids = [int(home["id"]) for home in homes]
+        except (ValueError, TypeError, KeyError):
+            ids = [int(match.group(1)) for match in self._ID_PATTERN.finditer(section)]
+
+        return list(dict.fromkeys(ids))
+
+    def _generate_reply(self, prompt: str) -> str:
+        """Score every candidate property and return the top 3 as JSON"""
+        seen = self._candidate_ids(prompt)
+
+        prompt_digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        evaluations = []
+        for home_id in seen:
+            digest = hashlib.sha256(f"{prompt_digest}:{home_id}".encode("utf-8")).digest()
+            score = round(0.5 + (digest[0] / 255.0) * 0.49, 2)
+            evaluations.append({
+                "id": home_id,
+                "score": score,
+                "explanation": f"Stand-in evaluation: property {home_id} scored {score:.2f} against your preferences."
+            })
+
+        evaluations.sort(key=lambda x: x["score"], reverse=True)
+        reply = evaluations[:3]
+
+        also_score = self._ALSO_SCORE_PATTERN.search(prompt)
+        if also_score:
+            wanted = set(json.loads(also_score.group(1))) - {evaluation["id"] for evaluation in reply}
+            reply += [evaluation for evaluation in evaluations[3:] if evaluation["id"] in wanted]
+        return json.dumps(reply, indent=2)
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when no recording exists for a request"""
+
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Capture completions to disk and replay them deterministically
+
+    Each request is keyed by a SHA-256 of (model, max_tokens, temperature,
+    messages) and stored as one JSON file in `directory`.
+
+    Args:
+        directory: Where recordings live
+        mode: 'record' calls `inner` and saves the result (overwriting),
+              'replay' serves only from disk
+        inner: Backend used in record mode
+        replay_latency: Sleep for the originally recorded latency on replay
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        directory: str,
+        mode: str = "replay",
+        inner: Optional[LLMBackend] = None,
+        replay_latency: bool = False
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown record/replay mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Record mode requires an inner backend")
+
+        self.directory = directory
+        self.mode = mode
+        self.inner = inner
+        self.replay_latency = replay_latency
+        self.name = mode
+        self._lock = threading.Lock()
+        self._memory: Dict[str, Dict[str, Any]] = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def request_key(model, max_tokens, temperature, messages) -> str:
+        """Stable key for a completion request"""
+        payload = json.dumps(
+            {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": messages
+            },
+            sort_keys=True,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def create_message(self, model, max_tokens, temperature, messages):
+        key = self.request_key(model, max_tokens, temperature, messages)
+
+        if self.mode == "record":
+            return self._record(key, model, max_tokens, temperature, messages)
+        return self._replay(key)
+
+    def _record(self, key, model, max_tokens, temperature, messages):
+        started = time.perf_counter()
+        message = self.inner.create_message(model, max_tokens, temperature, messages)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        recording = {
+            "request": {
+                "model": model,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "messages": messages
+            },
+            "response": {
+                "text": message.content[0].text,
+                "model": getattr(message, "model", model),
+                "stop_reason": getattr(message, "stop_reason", "end_turn"),
+                "input_tokens": message.usage.input_tokens,
+                "output_tokens": message.usage.output_tokens
+            },
+            "latency_ms": round(latency_ms, 1)
+        }
+
+        # Write atomically so concurrent load-test workers never read partial files
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(recording, f, indent=2)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._memory[key] = recording
+
+        return message
+
+    def _replay(self, key):
+        with self._lock:
+            recording = self._memory.get(key)
+
+        if recording is None:
+            try:
+                with open(self._path(key), "r") as f:
+                    recording = json.load(f)
+            except FileNotFoundError:
+                raise ReplayMissError(f"No recording for request {key[:12]} in {self.directory}")
+            with self._lock:
+                self._memory[key] = recording
+
+        if self.replay_latency:
+            time.sleep(recording.get("latency_ms", 0) / 1000.0)
+
+        response = recording["response"]
+        return Message(
+            response["text"],
+            response["model"],
+            response["input_tokens"],
+            response["output_tokens"],
+            stop_reason=response.get("stop_reason", "end_turn")
+        )
+
+
+def create_backend_from_env() -> LLMBackend:
+    """
+    Build the backend selected by the LLM_BACKEND environment variable
+
+    LLM_BACKEND:
+        anthropic (default) - real Claude API
+        standin             - local stand-in (LLM_STANDIN_LATENCY_MS,
+                              LLM_STANDIN_TOKENS_PER_SEC, LLM_STANDIN_JITTER)
+        record              - call Claude and save completions to LLM_RECORDINGS_DIR
+        replay              - serve completions from LLM_RECORDINGS_DIR only
+                              (LLM_REPLAY_LATENCY=1 to sleep recorded latency)
+
+    LLM_RECORDINGS_DIR defaults to ./llm_recordings under the working
+    directory, outside the package that is vendored into each host.
+    """
+    kind = os.environ.get("LLM_BACKEND", "anthropic").lower()
+    recordings_dir = os.environ.get(
+        "LLM_RECORDINGS_DIR",
+        os.path.join(os.getcwd(), "llm_recordings")
+    )
+
+    if kind == "anthropic":
+        return AnthropicBackend()
+
+    if kind == "standin":
+        return StandInBackend(
+            latency_ms=float(os.environ.get("LLM_STANDIN_LATENCY_MS", "400")),
+            tokens_per_second=float(os.environ.get("LLM_STANDIN_TOKENS_PER_SEC", "80")),
+            jitter=float(os.environ.get("LLM_STANDIN_JITTER", "0"))
+        )
+
+    if kind == "record":
+        return RecordReplayBackend(recordings_dir, mode="record", inner=AnthropicBackend())
+
+    if kind == "replay":
+        return RecordReplayBackend(
+            recordings_dir,
+            mode="replay",
+            replay_latency=os.environ.get("LLM_REPLAY_LATENCY", "0") == "1"
+        )
+
+    raise ValueError(
+        f"Unknown LLM_BACKEND '{kind}'. Expected one of: anthropic, standin, record, replay"
+    )
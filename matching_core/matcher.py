@@ -0,0 +1,781 @@
+"""
+Property Matcher Module - Real Claude API Integration
+This module uses Anthropic's Claude API for intelligent property matching
+with natural language understanding and explanation generation.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+from .dedup import ListingDeduper
+from .explain import MatchTrace
+from .filters import ListingIndex, compile_filters
+from .llm_backends import LLMBackend, create_backend_from_env, estimate_tokens
+from .ranker import JudgmentLog, LearnedRanker
+
+logger = logging.getLogger(__name__)
+
+class PropertyMatcher:
+    """
+    Property matching system using Claude API
+    Leverages Claude's understanding for intelligent matching and explanations
+    """
+    
+    model = os.environ.get("ANTHROPIC_MODEL", "claude-sonnet-4-20250514")
+    
+    # Rough completion size for the top-3 JSON answer
+    ESTIMATED_COMPLETION_TOKENS = 250
+    
+    def __init__(
+        self,
+        homes_data: List[Dict[str, Any]],
+        backend: Optional[LLMBackend] = None,
+        max_llm_candidates: Optional[int] = None,
+        dedupe: bool = True,
+        llm_batch_size: Optional[int] = None,
+        max_llm_workers: Optional[int] = None,
+        ranker: Optional[LearnedRanker] = None,
+        judgment_log: Optional[JudgmentLog] = None,
+        min_ranker_confidence: Optional[float] = None
+    ):
+        """
+        Initialize the matcher with property data and an LLM backend
+        
+        Args:
+            homes_data: List of property dictionaries
+            backend: Completion provider; defaults to the one selected by
+                     LLM_BACKEND (real Claude API unless configured otherwise)
+            max_llm_candidates: Most homes sent to the LLM in one prompt; larger
+                                candidate sets are prescreened with fallback
+                                scoring (default MATCH_MAX_LLM_CANDIDATES or 200)
+            dedupe: Collapse near-duplicate listings so only canonical ones
+                    are indexed and scored; variant ids are kept on results
+            llm_batch_size: Homes per LLM prompt; larger candidate sets are
+                            split and scored in parallel, then the batches'
+                            top 3s are re-ranked in one final call (default
+                            MATCH_LLM_BATCH_SIZE or 0 = never split)
+            max_llm_workers: LLM calls in flight across all threads using this
+                             matcher (default MATCH_LLM_WORKERS or 16)
+            ranker: Learned scoring tier served before the LLM and used in
+                    place of fallback scoring (default: loaded from
+                    RANKER_MODEL_PATH if set)
+            judgment_log: Where LLM judgments are logged for training the
+                          ranker (default: RANKER_LOG_PATH if set)
+            min_ranker_confidence: Ranker confidence needed to skip the LLM
+                                   (default RANKER_MIN_CONFIDENCE or 1.0)
+        
+        Thread safety:
+            find_matches() and estimate_cost() may be called from any number
+            of threads. They read an immutable index snapshot without locking;
+            upsert_home()/remove_home() are serialized and publish a new one
+            (and a new `homes` list, copy-on-write).
+            LLM calls from every thread share one bounded executor.
+        """
+        # Writers keep listings by id and publish `homes` as a fresh list after
+        # each change, so readers iterating it never see it mutate
+        self._homes_by_id: Dict[Any, Dict[str, Any]] = {home['id']: home for home in homes_data}
+        self.homes: List[Dict[str, Any]] = list(self._homes_by_id.values())
+        self.backend = backend if backend is not None else create_backend_from_env()
+        
+        if max_llm_candidates is None:
+            max_llm_candidates = int(os.environ.get("MATCH_MAX_LLM_CANDIDATES", "200"))
+        self.max_llm_candidates = max_llm_candidates
+        
+        if llm_batch_size is None:
+            llm_batch_size = int(os.environ.get("MATCH_LLM_BATCH_SIZE", "0"))
+        self.llm_batch_size = llm_batch_size
+        
+        if max_llm_workers is None:
+            max_llm_workers = int(os.environ.get("MATCH_LLM_WORKERS", "16"))
+        self._llm_executor = ThreadPoolExecutor(
+            max_workers=max_llm_workers, thread_name_prefix="llm-call"
+        )
+        
+        # Distilled ranker tier and the judgment log that trains it
+        if ranker is None and os.environ.get("RANKER_MODEL_PATH"):
+            ranker = LearnedRanker.load(os.environ["RANKER_MODEL_PATH"])
+        self.ranker = ranker
+        if judgment_log is None and os.environ.get("RANKER_LOG_PATH"):
+            judgment_log = JudgmentLog(os.environ["RANKER_LOG_PATH"])
+        self.judgment_log = judgment_log
+        if min_ranker_confidence is None:
+            min_ranker_confidence = float(os.environ.get("RANKER_MIN_CONFIDENCE", "1.0"))
+        self.min_ranker_confidence = min_ranker_confidence
+        
+        # Serializes listing writes; reads never take it
+        self._write_lock = threading.RLock()
+        
+        # Indexes and other derived state register here to hear about listing changes
+        self._listeners: List[Any] = []
+        
+        # Relistings and multi-agent copies are clustered under one canonical listing
+        self.deduper = ListingDeduper() if dedupe else None
+        canonical_homes = self.deduper.collapse(homes_data) if dedupe else homes_data
+        
+        # Columnar indexes used to push hard filters down before scoring
+        self.index = ListingIndex(canonical_homes)
+        self.subscribe(self.index)
+    
+    @property
+    def canonical_homes(self) -> List[Dict[str, Any]]:
+        """Listings that take part in matching (one per duplicate cluster)"""
+        homes = self.homes
+        if self.deduper is None:
+            return list(homes)
+        return [home for home in homes if self.deduper.is_canonical(home['id'])]
+    
+    def get_home(self, home_id: Any) -> Optional[Dict[str, Any]]:
+        """The current version of a listing (canonical or not), or None"""
+        return self._homes_by_id.get(home_id)
+    
+    def subscribe(self, listener: Any):
+        """
+        Register a listener for listing changes
+        
+        Listeners implement on_listing_upserted(home, previous) and
+        on_listing_removed(home). With deduplication on, they only hear
+        about canonical listings: a duplicate that joins an existing cluster
+        produces no event, and a canonical listing that is demoted or
+        replaced by a promoted variant produces a removal plus an upsert.
+        """
+        self._listeners.append(listener)
+    
+    def _notify_upserted(self, home: Dict[str, Any], previous: Optional[Dict[str, Any]]):
+        for listener in self._listeners:
+            listener.on_listing_upserted(home, previous)
+    
+    def _notify_removed(self, home: Dict[str, Any]):
+        for listener in self._listeners:
+            listener.on_listing_removed(home)
+    
+    def upsert_home(self, home: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Add a listing or replace the one with the same id
+        
+        Returns:
+            The previous version of the listing, or None if it is new
+        """
+        with self._write_lock:
+            return self._upsert_home_locked(home)
+    
+    def _upsert_home_locked(self, home: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        previous = self._homes_by_id.get(home['id'])
+        
+        if self.deduper is None:
+            self._store_home(home)
+            self._notify_upserted(home, previous)
+            return previous
+        
+        # Only the listing itself, a promoted variant or merged-away canonicals
+        # can change canonical status, so compare just those before and after.
+        # An edit keeps the listing's place in its cluster.
+        was_canonical = previous is not None and self.deduper.is_canonical(home['id'])
+        if previous is not None:
+            promoted, demoted_ids = self.deduper.update(home)
+        else:
+            promoted = None
+            _, demoted_ids = self.deduper.add(home)
+        # Only once the deduper has accepted the change, so a failure leaves both untouched
+        self._store_home(home)
+        
+        before = {home['id']: (previous if was_canonical else None)}
+        if promoted is not None:
+            before[promoted['id']] = None
+        for demoted_id in demoted_ids:
+            # A variant promoted above was never canonical as far as listeners know
+            before.setdefault(demoted_id, self.deduper.get(demoted_id))
+        
+        for listing_id, old_version in before.items():
+            current = self.deduper.get(listing_id)
+            if self.deduper.is_canonical(listing_id):
+                self._notify_upserted(current, old_version)
+            elif old_version is not None:
+                self._notify_removed(old_version)
+        
+        return previous
+    
+    def _store_home(self, home: Dict[str, Any]):
+        self._homes_by_id[home['id']] = home
+        self.homes = list(self._homes_by_id.values())
+    
+    def _drop_home(self, home_id: Any) -> Dict[str, Any]:
+        removed = self._homes_by_id.pop(home_id)
+        self.homes = list(self._homes_by_id.values())
+        return removed
+    
+    def remove_home(self, home_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Remove a listing by id
+        
+        Returns:
+            The removed listing, or None if no listing had that id
+        """
+        with self._write_lock:
+            return self._remove_home_locked(home_id)
+    
+    def _remove_home_locked(self, home_id: int) -> Optional[Dict[str, Any]]:
+        if home_id not in self._homes_by_id:
+            return None
+        
+        if self.deduper is None:
+            removed = self._drop_home(home_id)
+            self._notify_removed(removed)
+            return removed
+        
+        was_canonical = self.deduper.is_canonical(home_id)
+        promoted = self.deduper.remove(home_id)
+        removed = self._drop_home(home_id)
+        if was_canonical:
+            self._notify_removed(removed)
+        if promoted is not None:
+            self._notify_upserted(promoted, None)
+        return removed
+    
+    def find_matches(
+        self, 
+        home_type: str, 
+        budget: int, 
+        amenities: List[str], 
+        custom_needs: str,
+        filters: Optional[Dict[str, Any]] = None,
+        trace: Optional[MatchTrace] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Find and rank properties using Claude API
+        
+        Uses Claude to:
+        1. Understand user preferences deeply
+        2. Evaluate each property against preferences
+        3. Generate match scores
+        4. Create natural language explanations
+        
+        Args:
+            home_type: Desired property type (or 'any')
+            budget: Maximum budget
+            amenities: List of desired amenities
+            custom_needs: Free-text custom requirements
+            filters: Optional structured constraints (see filters.compile_filters);
+                     'preferred_amenities' are added to the desired amenities
+            trace: Optional MatchTrace that receives the plan and per-stage figures
+        
+        Returns:
+            List of top 3 matched homes with scores and explanations
+        """
+        
+        if trace is None:
+            trace = MatchTrace()
+        
+        if filters and filters.get('preferred_amenities'):
+            amenities = list(dict.fromkeys(list(amenities) + filters['preferred_amenities']))
+        
+        trace.estimate = self.estimate_cost(home_type, budget, amenities, custom_needs, filters)
+        trace.tokens["estimated_prompt"] = trace.estimate["estimated_prompt_tokens"]
+        
+        # Apply hard constraints first so only qualifying homes reach the prompt
+        with trace.stage("filter") as stage:
+            filtered_homes = self._filter_homes(home_type, budget, filters, trace)
+            stage["candidates"] = len(filtered_homes)
+        
+        if not filtered_homes:
+            return []
+        
+        # Serve the learned ranker's answer when it is sure of its top 3
+        shadow_ids = None
+        if self.ranker is not None:
+            with trace.stage("ranker") as stage:
+                ranked, confidence = self.ranker.rank(filtered_homes, budget, amenities, custom_needs)
+                served = confidence >= self.min_ranker_confidence
+                stage["confidence"] = round(confidence, 3) if math.isfinite(confidence) else None
+                stage["served"] = served
+            if served:
+                return self._top_matches(ranked)
+            # Have the LLM score the ranker's picks too, so calibration can
+            # measure what serving them would have given up
+            shadow_ids = [home['id'] for home in ranked[:3]]
+            trace.note(
+                f"Ranker confidence {confidence:.2f} below {self.min_ranker_confidence}; "
+                f"deferred to the LLM"
+            )
+        
+        # Downgrade very broad queries: prescreen cheaply, send only the best to the LLM
+        if len(filtered_homes) > self.max_llm_candidates:
+            with trace.stage("prescreen") as stage:
+                prescreened = self._fallback_scoring(filtered_homes, budget, amenities, custom_needs)
+                keep = {home['id'] for home in prescreened[:self.max_llm_candidates]}
+                filtered_homes = [home for home in filtered_homes if home['id'] in keep]
+                stage["candidates"] = len(filtered_homes)
+            trace.note(
+                f"Candidate set exceeded {self.max_llm_candidates}; "
+                f"prescreened with fallback scoring before the LLM call"
+            )
+        
+        # Use Claude to evaluate and rank properties
+        matches = self._evaluate_with_claude(
+            filtered_homes, 
+            home_type, 
+            budget, 
+            amenities, 
+            custom_needs,
+            trace,
+            shadow_ids
+        )
+        
+        return self._top_matches(matches)
+    
+    def rank_candidates(
+        self,
+        homes: List[Dict[str, Any]],
+        home_type: str,
+        budget: int,
+        amenities: List[str],
+        custom_needs: str,
+        filters: Optional[Dict[str, Any]] = None,
+        trace: Optional[MatchTrace] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rank an explicit candidate set in one LLM call (top 3, best first)
+        
+        For callers that already know the few homes worth comparing, e.g. a
+        saved search's current top 3 plus one changed listing. The homes are
+        not checked against the hard constraints.
+        """
+        if trace is None:
+            trace = MatchTrace()
+        
+        if not homes:
+            return []
+        
+        if filters and filters.get('preferred_amenities'):
+            amenities = list(dict.fromkeys(list(amenities) + filters['preferred_amenities']))
+        
+        matches = self._evaluate_with_claude(homes, home_type, budget, amenities, custom_needs, trace)
+        return self._top_matches(matches)
+    
+    def next_candidates(
+        self,
+        home_type: str,
+        budget: int,
+        amenities: List[str],
+        custom_needs: str,
+        filters: Optional[Dict[str, Any]] = None,
+        exclude: Optional[set] = None,
+        limit: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Best qualifying homes outside `exclude`, by the cheap tier only
+        
+        Uses the learned ranker when one is loaded, otherwise the fallback
+        heuristic; no LLM call is made. Returns the listings themselves, not
+        scored copies, so they can be passed on to rank_candidates().
+        """
+        if filters and filters.get('preferred_amenities'):
+            amenities = list(dict.fromkeys(list(amenities) + filters['preferred_amenities']))
+        
+        exclude = exclude or set()
+        homes = [home for home in self._filter_homes(home_type, budget, filters) if home['id'] not in exclude]
+        if not homes:
+            return []
+        ranked = self._fallback_scoring(homes, budget, amenities, custom_needs)[:limit]
+        homes_by_id = {home['id']: home for home in homes}
+        return [homes_by_id[match['id']] for match in ranked]
+
+    def _top_matches(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        top_matches = matches[:3]  # Return top 3
+        if self.deduper is not None:
+            for match in top_matches:
+                match['variant_ids'] = self.deduper.variants(match['id'])
+        
+        return top_matches
+    
+    def estimate_cost(
+        self,
+        home_type: str,
+        budget: int,
+        amenities: List[str],
+        custom_needs: str,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Estimate the cost of a match before running it
+        
+        Uses only index statistics (no candidates are materialized and no LLM
+        call is made), so gateways can reject or downgrade broad queries.
+        
+        Returns:
+            Estimated candidates, candidates that would reach the LLM, prompt
+            and completion tokens, and whether the query would be prescreened
+        """
+        snapshot = self.index.snapshot
+        plan = compile_filters(home_type, budget, filters)
+        candidates = plan.estimate(snapshot)
+        llm_candidates = min(candidates, self.max_llm_candidates)
+        llm_calls = self._batch_count(llm_candidates)
+        
+        avg_home_chars = 0.0
+        if snapshot.size:
+            avg_home_chars = snapshot.total_serialized_chars / snapshot.size
+        
+        # Every call repeats the instructions and returns its own top 3
+        base_prompt = self._build_evaluation_prompt([], home_type, budget, amenities, custom_needs)
+        finalists = 3 * (llm_calls - 1) if llm_calls > 1 else 0
+        prompt_tokens = (
+            estimate_tokens(base_prompt) * llm_calls
+            + int((llm_candidates + finalists) * avg_home_chars / 4)
+        )
+        
+        return {
+            "plan": repr(plan),
+            "estimated_candidates": candidates,
+            "llm_candidates": llm_candidates,
+            "llm_calls": llm_calls,
+            "estimated_prompt_tokens": prompt_tokens,
+            "estimated_completion_tokens": self.ESTIMATED_COMPLETION_TOKENS * llm_calls,
+            "prescreened": candidates > self.max_llm_candidates
+        }
+    
+    def _batch_count(self, homes: int) -> int:
+        """LLM calls needed to score this many homes (batches plus the final re-rank)"""
+        if homes == 0:
+            return 0
+        if not self.llm_batch_size or homes <= self.llm_batch_size:
+            return 1
+        return math.ceil(homes / self.llm_batch_size) + 1
+    
+    def _filter_homes(
+        self,
+        home_type: str,
+        budget: int,
+        filters: Optional[Dict[str, Any]] = None,
+        trace: Optional[MatchTrace] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Pre-filter properties by type, budget and structured constraints
+        """
+        plan = compile_filters(home_type, budget, filters)
+        return plan.execute(self.index.snapshot, trace)
+    
+    def _evaluate_with_claude(
+        self,
+        homes: List[Dict[str, Any]],
+        home_type: str,
+        budget: int,
+        amenities: List[str],
+        custom_needs: str,
+        trace: Optional[MatchTrace] = None,
+        shadow_ids: Optional[List[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Use Claude to evaluate and rank properties with explanations
+        
+        Candidate sets larger than llm_batch_size are split into batches that
+        are scored concurrently on the shared LLM executor. Scores from
+        different prompts are not comparable, so the batches' top 3s are then
+        re-ranked together in one final call.
+        
+        shadow_ids (the learned ranker's picks) are scored as well, in
+        whichever batch holds them, and only logged as ranker training data.
+        """
+        if trace is None:
+            trace = MatchTrace()
+        
+        if self.llm_batch_size and len(homes) > self.llm_batch_size:
+            batches = [
+                homes[i:i + self.llm_batch_size]
+                for i in range(0, len(homes), self.llm_batch_size)
+            ]
+        else:
+            batches = [homes]
+        
+        preferences = {
+            "home_type": home_type,
+            "budget": budget,
+            "amenities": list(amenities),
+            "custom_needs": custom_needs
+        }
+        
+        try:
+            matches = self._score_batches(batches, preferences, trace, shadow_ids)
+            if len(batches) > 1:
+                homes_by_id = {home['id']: home for home in homes}
+                finalists = [homes_by_id[match['id']] for match in matches]
+                trace.note(f"Scored {len(batches)} batches; re-ranked their {len(finalists)} finalists together")
+                matches = self._score_batches([finalists], preferences, trace)
+            return matches
+            
+        except Exception as e:
+            logger.error("Error calling Claude API: %s", e)
+            trace.note(f"LLM call failed ({e}); used fallback scoring")
+            # Fallback to simple scoring if API fails
+            with trace.stage("fallback_scoring"):
+                return self._fallback_scoring(homes, budget, amenities, custom_needs)
+    
+    def _score_batches(
+        self,
+        batches: List[List[Dict[str, Any]]],
+        preferences: Dict[str, Any],
+        trace: MatchTrace,
+        shadow_ids: Optional[List[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """One concurrent LLM call per batch; returns every batch's picks, best first"""
+        shadow = set(shadow_ids or [])
+        batch_shadow_ids = [[home['id'] for home in batch if home['id'] in shadow] for batch in batches]
+        
+        # Prepare the prompt for Claude
+        with trace.stage("build_prompt") as stage:
+            prompts = [
+                self._build_evaluation_prompt(
+                    batch, preferences["home_type"], preferences["budget"],
+                    preferences["amenities"], preferences["custom_needs"], also_score
+                )
+                for batch, also_score in zip(batches, batch_shadow_ids)
+            ]
+            stage["homes"] = sum(len(batch) for batch in batches)
+            stage["batches"] = len(batches)
+            stage["prompt_chars"] = sum(len(prompt) for prompt in prompts)
+        
+        # Keep the pre-execution estimate if find_matches already recorded one
+        trace.tokens.setdefault("estimated_prompt", sum(estimate_tokens(prompt) for prompt in prompts))
+        
+        # Call Claude API (or the configured stand-in/replay backend)
+        with trace.stage("llm_call") as stage:
+            stage["backend"] = self.backend.name
+            stage["model"] = self.model
+            stage["calls"] = len(prompts)
+            futures = [self._llm_executor.submit(self._create_message, prompt) for prompt in prompts]
+            messages = [future.result() for future in futures]
+        
+        trace.tokens["actual_prompt"] = (
+            trace.tokens.get("actual_prompt", 0) + sum(message.usage.input_tokens for message in messages)
+        )
+        trace.tokens["actual_completion"] = (
+            trace.tokens.get("actual_completion", 0) + sum(message.usage.output_tokens for message in messages)
+        )
+        cache_reads = [
+            getattr(message.usage, "cache_read_input_tokens", None) for message in messages
+        ]
+        if any(cache_read is not None for cache_read in cache_reads):
+            trace.tokens["cache_read_prompt"] = (
+                trace.tokens.get("cache_read_prompt", 0) + sum(cache_read or 0 for cache_read in cache_reads)
+            )
+            for cache_read in cache_reads:
+                trace.count_cache("llm_prompt", bool(cache_read))
+        
+        # Parse Claude's response
+        with trace.stage("parse") as stage:
+            matches = []
+            for message, batch, also_score in zip(messages, batches, batch_shadow_ids):
+                response_text = message.content[0].text
+                matches.extend(self._parse_claude_response(response_text, batch, preferences, also_score))
+            if len(batches) > 1:
+                matches.sort(key=lambda x: x['score'], reverse=True)
+            stage["matches"] = len(matches)
+        
+        return matches
+    
+    def _create_message(self, prompt: str) -> Any:
+        """One evaluation call; runs on the bounded LLM executor"""
+        return self.backend.create_message(
+            model=self.model,
+            max_tokens=2000,
+            temperature=0.3,  # Lower temperature for more consistent scoring
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        )
+    
+    def close(self):
+        """Stop the LLM executor (pending calls finish first)"""
+        self._llm_executor.shutdown(wait=True)
+    
+    def _build_evaluation_prompt(
+        self,
+        homes: List[Dict[str, Any]],
+        home_type: str,
+        budget: int,
+        amenities: List[str],
+        custom_needs: str,
+        also_score: Optional[List[Any]] = None
+    ) -> str:
+        """
+        Build a comprehensive prompt for Claude to evaluate properties
+        
+        Property ids in also_score are to be scored after the top 3 even if
+        they are not among the best.
+        """
+        
+        amenities_str = ", ".join(amenities) if amenities else "none specified"
+        custom_needs_str = custom_needs if custom_needs.strip() else "none specified"
+        
+        # Format homes data
+        homes_json = json.dumps(homes, indent=2)
+        
+        prompt = f"""You are a real estate AI assistant helping match homebuyers with properties.
+
+USER PREFERENCES:
+- Property Type: {home_type}
+- Maximum Budget: ${budget:,}
+- Desired Amenities: {amenities_str}
+- Custom Needs: {custom_needs_str}
+
+AVAILABLE PROPERTIES:
+{homes_json}
+
+TASK:
+Evaluate each property and provide a match score from 0.0 to 1.0 based on how well it fits the user's preferences. Consider:
+
+1. **Budget Fit** (30% weight): How well does the price match the budget?
+   - Properties at 70-90% of budget are ideal
+   - Too cheap might indicate quality concerns
+   - Close to budget limit is good
+
+2. **Amenities Match** (40% weight): How many desired amenities does it have?
+   - Each matching amenity increases the score
+   - Extra amenities are a bonus
+
+3. **Custom Needs** (30% weight): How well does it address specific requirements?
+   - Look for semantic matches, not just keywords
+   - Consider lifestyle fit and practical needs
+
+RESPONSE FORMAT (important - respond ONLY with valid JSON):
+Return a JSON array with the top 3 properties, each with:
+{{
+  "id": <property_id>,
+  "score": <0.0-1.0>,
+  "explanation": "<brief, natural explanation 1-2 sentences explaining why this property matches>"
+}}
+
+Example:
+[
+  {{
+    "id": 1,
+    "score": 0.89,
+    "explanation": "This home is perfectly priced at $485,000 within your budget, features your desired pool and park amenities, and has a spacious backyard ideal for your outdoor needs."
+  }}
+]
+
+Return ONLY the JSON array, no other text. Rank by best matches first."""
+
+        if also_score:
+            prompt += f"""
+
+ALSO SCORE: {json.dumps(also_score)}
+After the top 3, append an entry in the same format for each of these property ids that is not already in your top 3, scored the same way."""
+
+        return prompt
+    
+    def _parse_claude_response(
+        self, 
+        response_text: str, 
+        homes: List[Dict[str, Any]],
+        preferences: Optional[Dict[str, Any]] = None,
+        also_score: Optional[List[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Parse Claude's JSON response and merge with property data
+        
+        With a judgment log configured, the homes the LLM saw and the ones it
+        returned are logged as ranker training data. Entries after the top 3
+        for ids in also_score are logged as shadow scores and not returned.
+        """
+        try:
+            # Extract JSON from response
+            # Claude might add text before/after JSON, so find the JSON array
+            start_idx = response_text.find('[')
+            end_idx = response_text.rfind(']') + 1
+            
+            if start_idx == -1 or end_idx == 0:
+                raise ValueError("No JSON array found in response")
+            
+            json_str = response_text[start_idx:end_idx]
+            evaluations = json.loads(json_str)
+            
+            # Create a dict for quick home lookup
+            homes_dict = {home['id']: home for home in homes}
+            
+            # Merge evaluations with full home data
+            matches = []
+            for eval_item in evaluations:
+                home_id = eval_item['id']
+                if home_id in homes_dict:
+                    home = homes_dict[home_id].copy()
+                    home['score'] = eval_item['score']
+                    home['explanation'] = eval_item['explanation']
+                    matches.append(home)
+            
+            shadow = []
+            if also_score:
+                shadow = [match for match in matches[3:] if match['id'] in set(also_score)]
+                matches = matches[:3]
+            
+            if self.judgment_log is not None and preferences is not None:
+                self.judgment_log.record(
+                    preferences,
+                    homes,
+                    [(match['id'], float(match['score'])) for match in matches],
+                    [(match['id'], float(match['score'])) for match in shadow]
+                )
+            
+            return matches
+            
+        except Exception as e:
+            logger.error("Error parsing Claude response: %s", e)
+            logger.debug("Response was: %s", response_text)
+            # Return fallback if parsing fails
+            return self._fallback_scoring(homes, 0, [], "")
+    
+    def _fallback_scoring(
+        self,
+        homes: List[Dict[str, Any]],
+        budget: int,
+        amenities: List[str],
+        custom_needs: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Simple fallback scoring if Claude API fails
+        
+        Uses the learned ranker when one is loaded, otherwise a fixed
+        budget/amenity heuristic.
+        """
+        if self.ranker is not None:
+            ranked, _ = self.ranker.rank(homes, budget, amenities, custom_needs)
+            return ranked
+        
+        scored_homes = []
+        
+        for home in homes:
+            # Simple scoring logic
+            score = 0.5  # Base score
+            
+            # Budget factor
+            if budget > 0:
+                price_ratio = home['price'] / budget
+                if 0.7 <= price_ratio <= 0.9:
+                    score += 0.2
+                elif price_ratio < 0.7:
+                    score += 0.1
+            
+            # Amenity factor
+            if amenities:
+                home_amenities = set(home.get('amenities', []))
+                desired = set(amenities)
+                overlap = len(home_amenities & desired)
+                score += (overlap / len(desired)) * 0.3
+            
+            home_copy = home.copy()
+            home_copy['score'] = round(score, 3)
+            home_copy['explanation'] = f"This {home['type']} home at ${home['price']:,} offers {home['bedrooms']} bedrooms and {home['bathrooms']} bathrooms in {home['location']}."
+            
+            scored_homes.append(home_copy)
+        
+        # Sort by score descending
+        scored_homes.sort(key=lambda x: x['score'], reverse=True)
+        
+        return scored_homes
\ No newline at end of file
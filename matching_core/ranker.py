@@ -0,0 +1,545 @@
+"""
+Learned Ranker - a CPU-only scoring tier distilled from LLM judgments
+PropertyMatcher logs every candidate set it sends to the LLM together with
+the top 3 the LLM picked from it. A pairwise logistic model over features
+engineered from the same budget/amenities/custom-needs rubric learns from
+that log that the picked homes beat the rest, and is served in front of the
+LLM. Only requests where the model is unsure of its top 3 still reach the
+LLM; those calls also have the LLM score the model's top 3, which measures
+how much LLM score serving the model would have given up.
+
+Usage:
+    RANKER_LOG_PATH=judgments.jsonl uvicorn main:app        # collect judgments
+    python -m matching_core.train_ranker --log judgments.jsonl --out ranker.json
+    RANKER_MODEL_PATH=ranker.json uvicorn main:app          # serve the model
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FEATURES = (
+    "price_ratio",
+    "in_ideal_band",
+    "band_distance",
+    "amenity_match",
+    "no_amenities_requested",
+    "extra_amenities",
+    "needs_overlap",
+    "no_custom_needs",
+    "bedrooms",
+    "bathrooms",
+    "sq_ft_thousands",
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its my need needs of on or "
+    "our should that the to want we with would like love".split()
+)
+
+
+def _tokens(text: str) -> set:
+    return {
+        token for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 2 and token not in _STOPWORDS
+    }
+
+
+def featurize(
+    home: Dict[str, Any],
+    budget: int,
+    amenities: List[str],
+    custom_needs: str
+) -> List[float]:
+    """Feature vector for one (preferences, home) pair, in FEATURES order"""
+    price_ratio = home["price"] / budget if budget and budget > 0 else 1.0
+    band_distance = max(0.0, 0.7 - price_ratio, price_ratio - 0.9)
+
+    home_amenities = set(home.get("amenities", []))
+    desired = set(amenities or [])
+    amenity_match = len(home_amenities & desired) / len(desired) if desired else 0.0
+
+    needs = _tokens(custom_needs or "")
+    needs_overlap = 0.0
+    if needs:
+        home_text = " ".join([
+            home.get("name", ""), home.get("description", ""),
+            home.get("location", ""), " ".join(home_amenities)
+        ])
+        needs_overlap = len(needs & _tokens(home_text)) / len(needs)
+
+    return [
+        price_ratio,
+        1.0 if band_distance == 0.0 else 0.0,
+        band_distance,
+        amenity_match,
+        0.0 if desired else 1.0,
+        float(len(home_amenities - desired)),
+        needs_overlap,
+        0.0 if needs else 1.0,
+        float(home["bedrooms"]),
+        float(home["bathrooms"]),
+        home["sq_ft"] / 1000.0,
+    ]
+
+
+class JudgmentLog:
+    """
+    Append-only JSONL log of LLM judgments, safe to share across threads
+
+    Each line is one LLM call: {"preferences": {...}, "candidates": [home,
+    ...], "judged": [{"id": ..., "score": float}, ...], "shadow": [...],
+    "at": ts}, where `judged` is the top 3 the LLM returned, best first, and
+    every other candidate was passed over. `shadow` holds the LLM's scores
+    for the serving ranker's picks it passed over (empty without a ranker).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def record(
+        self,
+        preferences: Dict[str, Any],
+        candidates: List[Dict[str, Any]],
+        judged: List[Tuple[Any, float]],
+        shadow: Optional[List[Tuple[Any, float]]] = None
+    ):
+        """Append one LLM call: the candidates it saw, its (id, score) picks and shadow scores"""
+        if not judged:
+            return
+        line = json.dumps({
+            "preferences": preferences,
+            "candidates": candidates,
+            "judged": [{"id": home_id, "score": score} for home_id, score in judged],
+            "shadow": [{"id": home_id, "score": score} for home_id, score in shadow or []],
+            "at": time.time()
+        })
+        try:
+            with self._lock:
+                with open(self.path, "a") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            # Training data is best effort; never fail a match over it
+            logger.error("Error writing judgment log %s: %s", self.path, e)
+
+
+def read_judgments(path: str) -> List[Dict[str, Any]]:
+    """Load a judgment log, skipping malformed lines"""
+    judgments = []
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                record["preferences"]["budget"]
+                candidate_ids = {home["id"] for home in record["candidates"]}
+                if not record["judged"]:
+                    continue
+                for item in record["judged"] + record["shadow"]:
+                    float(item["score"])
+                    if item["id"] not in candidate_ids:
+                        raise ValueError("judged home is not a candidate")
+                judgments.append(record)
+            except (ValueError, KeyError, TypeError):
+                continue
+    return judgments
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> List[float]:
+    """Solve a small dense linear system by Gaussian elimination with pivoting"""
+    n = len(vector)
+    rows = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(rows[r][col]))
+        rows[col], rows[pivot] = rows[pivot], rows[col]
+        if abs(rows[col][col]) < 1e-12:
+            continue
+        for r in range(col + 1, n):
+            factor = rows[r][col] / rows[col][col]
+            if factor:
+                for c in range(col, n + 1):
+                    rows[r][c] -= factor * rows[col][c]
+    solution = [0.0] * n
+    for row in range(n - 1, -1, -1):
+        if abs(rows[row][row]) < 1e-12:
+            continue
+        total = rows[row][n] - sum(rows[row][c] * solution[c] for c in range(row + 1, n))
+        solution[row] = total / rows[row][row]
+    return solution
+
+
+def segment_of(custom_needs: str) -> str:
+    """Requests with free-text needs are judged partly on semantics the features only approximate"""
+    return "custom_needs" if _tokens(custom_needs or "") else "no_custom_needs"
+
+
+class LearnedRanker:
+    """
+    Pairwise logistic model over standardized rubric features
+
+    Trained so that each home the LLM returned outranks every candidate it
+    passed over (and higher-scored picks outrank lower-scored ones). Served
+    scores map the model's utility onto the LLM's score scale with a linear
+    fit on the picked homes.
+
+    Confidence of a ranking is the utility gap between the 3rd and 4th homes
+    divided by the segment's calibrated margin (requests with or without
+    custom needs). calibrate() sets that margin from LLM calls logged while
+    this model deferred, in which the LLM also scored the model's top 3: it
+    is the smallest gap at which requests at or above it had a mean score
+    regret of at most `max_regret` (the LLM's score for its own top 3 minus
+    its score for the model's, averaged over the three). Exact ids are not
+    required to match, since near-ties among candidates make the LLM's picks
+    a toss-up. Confidence >= 1.0 means requests like this one have given up
+    that little. Uncalibrated segments, segments where no margin is that
+    good on enough requests, and requests whose features fall far outside
+    the training candidates get confidence 0, so the LLM decides.
+
+    Args:
+        weights: Per-feature weights on standardized features
+        means, stds: Standardization parameters per feature
+        score_bias, score_scale: Linear map from utility to a 0-1 score
+        segment_margin: Calibrated utility margin per segment (None = the
+                        LLM always decides)
+        max_regret: Mean score regret the margins were calibrated to
+        samples: Number of logged LLM calls the model was trained on
+    """
+
+    # Standardized feature values beyond this are treated as extrapolation
+    MAX_ABS_Z = 4.0
+
+    MIN_TRAINING_SAMPLES = 30
+    MIN_SEGMENT_CALLS = 10
+
+    # Pairs sampled per logged call, to keep Newton steps cheap on big candidate sets
+    MAX_PAIRS_PER_CALL = 40
+    MAX_NEWTON_STEPS = 25
+
+    def __init__(
+        self,
+        weights: List[float],
+        means: List[float],
+        stds: List[float],
+        score_bias: float = 0.5,
+        score_scale: float = 0.0,
+        segment_margin: Optional[Dict[str, Optional[float]]] = None,
+        max_regret: float = 0.05,
+        samples: int = 0
+    ):
+        self.weights = weights
+        self.means = means
+        self.stds = stds
+        self.score_bias = score_bias
+        self.score_scale = score_scale
+        self.segment_margin = segment_margin or {}
+        self.max_regret = max_regret
+        self.samples = samples
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def fit(cls, judgments: List[Dict[str, Any]], l2: float = 1.0) -> "LearnedRanker":
+        """
+        Train on logged LLM calls
+
+        The returned model is uncalibrated, so it always defers to the LLM;
+        serve it to collect the log that calibrate() needs.
+        """
+        if len(judgments) < cls.MIN_TRAINING_SAMPLES:
+            raise ValueError(
+                f"Need at least {cls.MIN_TRAINING_SAMPLES} logged LLM calls to train, got {len(judgments)}"
+            )
+
+        calls = [cls._call_of(record) for record in judgments]
+        model = cls._fit_calls(calls, l2)
+        model.samples = len(calls)
+        return model
+
+    def calibrate(self, judgments: List[Dict[str, Any]], max_regret: float = 0.05) -> Dict[str, Any]:
+        """
+        Set each segment's margin from LLM calls logged while this model deferred
+
+        Only calls where the LLM scored all of this model's top 3, as picks
+        or shadow scores, are used; the log the model was trained on has
+        none. Calls logged while it served are never logged, so recalibrate
+        on a log collected with RANKER_MIN_CONFIDENCE=inf.
+
+        Returns:
+            Per-segment regret, margin and the share of calls it would serve
+        """
+        evaluated: Dict[str, List[Tuple[float, float]]] = {"custom_needs": [], "no_custom_needs": []}
+        unscored = {segment: 0 for segment in evaluated}
+        for record in judgments:
+            call = self._call_of(record)
+            if len(call["features"]) <= 3:
+                continue
+            ranked = sorted(call["features"], key=lambda home_id: -self.utility(call["features"][home_id]))
+            utilities = [self.utility(call["features"][home_id]) for home_id in ranked[:4]]
+            llm_scores = {**call["shadow"], **dict(call["judged"])}
+            picks = call["judged"][:3]
+            if any(home_id not in llm_scores for home_id in ranked[:len(picks)]):
+                unscored[call["segment"]] += 1
+                continue
+            regret = (
+                sum(score for _, score in picks)
+                - sum(llm_scores[home_id] for home_id in ranked[:len(picks)])
+            ) / len(picks)
+            evaluated[call["segment"]].append((utilities[2] - utilities[3], max(0.0, regret)))
+
+        self.max_regret = max_regret
+        metrics: Dict[str, Any] = {"max_regret": max_regret, "segments": {}}
+        for segment, results in evaluated.items():
+            margin, served = self._calibrate_margin(results, max_regret)
+            self.segment_margin[segment] = margin
+            metrics["segments"][segment] = {
+                "calls": len(results) + unscored[segment],
+                "scored_calls": len(results),
+                "regret": round(sum(r for _, r in results) / len(results), 4) if results else None,
+                "margin": None if margin is None else round(margin, 4),
+                "served_share": round(len(served) / len(results), 4) if results else None,
+                "served_regret": round(sum(r for _, r in served) / len(served), 4) if served else None
+            }
+        return metrics
+
+    @staticmethod
+    def _call_of(record: Dict[str, Any]) -> Dict[str, Any]:
+        prefs = record["preferences"]
+        custom_needs = prefs.get("custom_needs") or ""
+        features = {
+            home["id"]: featurize(home, prefs["budget"], prefs.get("amenities") or [], custom_needs)
+            for home in record["candidates"]
+        }
+        judged = sorted(record["judged"], key=lambda item: -float(item["score"]))
+        request_key = json.dumps(prefs, sort_keys=True)
+        return {
+            "features": features,
+            "judged": [(item["id"], float(item["score"])) for item in judged],
+            "shadow": {item["id"]: float(item["score"]) for item in record["shadow"]},
+            "segment": segment_of(custom_needs),
+            "seed": int(hashlib.sha256(request_key.encode("utf-8")).hexdigest(), 16)
+        }
+
+    @classmethod
+    def _calibrate_margin(
+        cls,
+        results: List[Tuple[float, float]],
+        max_regret: float
+    ) -> Tuple[Optional[float], List[Tuple[float, float]]]:
+        """
+        Smallest margin whose requests at or above it have a mean score
+        regret of at most `max_regret`, counting only margins with
+        MIN_SEGMENT_CALLS requests behind them
+
+        Returns:
+            (margin or None, the (margin, regret) pairs it serves)
+        """
+        ordered = sorted(results, key=lambda item: -item[0])
+        best = None
+        total = 0.0
+        for count, (margin, regret) in enumerate(ordered, start=1):
+            total += regret
+            if count >= cls.MIN_SEGMENT_CALLS and total / count <= max_regret and margin > 0:
+                best = count
+        if best is None:
+            return None, []
+        return ordered[best - 1][0], ordered[:best]
+
+    @classmethod
+    def _fit_calls(cls, calls: List[Dict[str, Any]], l2: float) -> "LearnedRanker":
+        dims = len(FEATURES)
+        vectors = [x for call in calls for x in call["features"].values()]
+        count = len(vectors)
+        means = [sum(x[i] for x in vectors) / count for i in range(dims)]
+        stds = [
+            math.sqrt(sum((x[i] - means[i]) ** 2 for x in vectors) / count) or 1.0
+            for i in range(dims)
+        ]
+        model = cls([0.0] * dims, means, stds)
+
+        # Winner-minus-loser differences: picks over passed-over candidates,
+        # and higher-scored picks over lower-scored ones
+        differences = []
+        for call in calls:
+            features = call["features"]
+            picked = [home_id for home_id, _ in call["judged"]]
+            passed_over = [home_id for home_id in features if home_id not in set(picked)]
+            pairs = [(winner, loser) for winner in picked for loser in passed_over]
+            pairs += [
+                (winner, loser)
+                for i, (winner, winner_score) in enumerate(call["judged"])
+                for loser, loser_score in call["judged"][i + 1:]
+                if winner_score > loser_score
+            ]
+            if len(pairs) > cls.MAX_PAIRS_PER_CALL:
+                pairs = random.Random(call["seed"]).sample(pairs, cls.MAX_PAIRS_PER_CALL)
+            for winner, loser in pairs:
+                z_winner = model._standardize(features[winner])
+                z_loser = model._standardize(features[loser])
+                differences.append([a - b for a, b in zip(z_winner, z_loser)])
+
+        # Newton's method on the L2-regularized logistic loss
+        weights = [0.0] * dims
+        for _ in range(cls.MAX_NEWTON_STEPS):
+            gradient = [l2 * w for w in weights]
+            hessian = [[l2 if i == j else 0.0 for j in range(dims)] for i in range(dims)]
+            for d in differences:
+                margin = sum(w * value for w, value in zip(weights, d))
+                p = 1.0 / (1.0 + math.exp(-margin)) if margin > -30 else 0.0
+                for i in range(dims):
+                    gradient[i] += (p - 1.0) * d[i]
+                    curvature = p * (1.0 - p) * d[i]
+                    if curvature:
+                        for j in range(i, dims):
+                            hessian[i][j] += curvature * d[j]
+            for i in range(dims):
+                for j in range(i):
+                    hessian[i][j] = hessian[j][i]
+            step = _solve(hessian, gradient)
+            weights = [w - s for w, s in zip(weights, step)]
+            if max(abs(s) for s in step) < 1e-6:
+                break
+        model.weights = weights
+
+        # Put utilities on the LLM's score scale using the picked homes
+        points = [
+            (model.utility(call["features"][home_id]), score)
+            for call in calls for home_id, score in call["judged"]
+        ]
+        mean_u = sum(u for u, _ in points) / len(points)
+        mean_score = sum(score for _, score in points) / len(points)
+        spread = sum((u - mean_u) ** 2 for u, _ in points)
+        scale = sum((u - mean_u) * (score - mean_score) for u, score in points) / spread if spread else 0.0
+        model.score_scale = max(0.0, scale)
+        model.score_bias = mean_score - model.score_scale * mean_u
+        return model
+
+    # ------------------------------------------------------------------
+    # Serving
+    # ------------------------------------------------------------------
+
+    def _standardize(self, features: List[float]) -> List[float]:
+        return [(value - mean) / std for value, mean, std in zip(features, self.means, self.stds)]
+
+    def utility(self, features: List[float]) -> float:
+        z = self._standardize(features)
+        return sum(w * value for w, value in zip(self.weights, z))
+
+    def predict(self, features: List[float]) -> float:
+        """Score on the LLM's 0-1 scale"""
+        return min(1.0, max(0.0, self.score_bias + self.score_scale * self.utility(features)))
+
+    def rank(
+        self,
+        homes: List[Dict[str, Any]],
+        budget: int,
+        amenities: List[str],
+        custom_needs: str
+    ) -> Tuple[List[Dict[str, Any]], float]:
+        """
+        Score and sort homes
+
+        Returns:
+            (homes with 'score' and 'explanation', best first; confidence in
+            the top 3, where >= 1.0 means calibration requests with at least
+            this margin gave up at most `max_regret` of LLM score)
+        """
+        predictions = []
+        for home in homes:
+            features = featurize(home, budget, amenities, custom_needs)
+            predictions.append((self.utility(features), features, home))
+        predictions.sort(key=lambda item: item[0], reverse=True)
+
+        # Homes around the top-3 cut-off far outside the training candidates
+        # are extrapolation the calibration says nothing about
+        extrapolating = any(
+            abs(value) > self.MAX_ABS_Z
+            for _, features, _ in predictions[:4]
+            for value in self._standardize(features)
+        )
+
+        scored = []
+        for utility, features, home in predictions:
+            home_copy = home.copy()
+            home_copy['score'] = round(min(1.0, max(0.0, self.score_bias + self.score_scale * utility)), 3)
+            home_copy['explanation'] = self._explain(home, features, budget, amenities)
+            scored.append(home_copy)
+
+        margin = self.segment_margin.get(segment_of(custom_needs))
+        if extrapolating or margin is None:
+            confidence = 0.0
+        elif len(scored) <= 3:
+            confidence = math.inf
+        else:
+            confidence = (predictions[2][0] - predictions[3][0]) / margin
+        return scored, confidence
+
+    @staticmethod
+    def _explain(
+        home: Dict[str, Any],
+        features: List[float],
+        budget: int,
+        amenities: List[str]
+    ) -> str:
+        values = dict(zip(FEATURES, features))
+        parts = [f"This {home['type']} home at ${home['price']:,}"]
+        if budget and budget > 0:
+            parts[0] += f" ({values['price_ratio']:.0%} of your budget)"
+
+        matched = [amenity for amenity in amenities or [] if amenity in set(home.get("amenities", []))]
+        if matched:
+            parts.append(f"has {len(matched)} of your {len(amenities)} desired amenities ({', '.join(matched)})")
+        parts.append(f"offers {home['bedrooms']} bedrooms and {home['bathrooms']} bathrooms in {home['location']}")
+        if values["needs_overlap"] >= 0.5:
+            parts.append("and its description matches much of what you asked for")
+        return ", ".join(parts) + "."
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "features": list(FEATURES),
+            "weights": self.weights,
+            "means": self.means,
+            "stds": self.stds,
+            "score_bias": self.score_bias,
+            "score_scale": self.score_scale,
+            "segment_margin": self.segment_margin,
+            "max_regret": self.max_regret,
+            "samples": self.samples
+        }
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LearnedRanker":
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("features") != list(FEATURES):
+            raise ValueError(f"Ranker model {path} was trained on different features; retrain it")
+        return cls(
+            data["weights"], data["means"], data["stds"],
+            score_bias=data["score_bias"], score_scale=data["score_scale"],
+            segment_margin=data["segment_margin"], max_regret=data["max_regret"],
+            samples=data["samples"]
+        )
+
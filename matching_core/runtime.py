@@ -0,0 +1,167 @@
+"""
+Warm-process runtime - one matcher per process, shared by every request
+Loading listings, building the dedup clusters and column indexes, and opening
+the Anthropic client's connection pool are paid once per process (a FastAPI
+worker or a warm Azure Functions instance) and reused by later requests.
+
+The facet index, saved-search registry, admission controller and the
+request policies configured by environment variables live here too, so
+both hosts build them the same way.
+"""
+
+import hmac
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional
+
+from .admission import AdmissionController
+from .facets import FacetIndex
+from .llm_backends import LLMBackend, create_backend_from_env
+from .matcher import PropertyMatcher
+from .saved_searches import SavedSearchRegistry
+
+_REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Reentrant: building the matcher builds the backend, and so on
+_lock = threading.RLock()
+_instances: Dict[str, Any] = {}
+
+
+class QueryTooBroad(Exception):
+    """A match request would evaluate more candidates than allowed; maps to HTTP 422"""
+
+    def __init__(self, estimated: int, limit: int):
+        super().__init__(
+            f"Query would evaluate ~{estimated} properties "
+            f"(limit {limit}). Narrow the type, budget or filters."
+        )
+        self.estimated = estimated
+        self.limit = limit
+
+
+class ListingWriteDenied(Exception):
+    """Listing writes are disabled or the admin token is wrong; maps to HTTP 403"""
+
+
+def load_homes_data(base_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Load property data from homes.json
+
+    Looks at HOMES_DATA_PATH, then data/homes.json next to and one level
+    above the host's directory, then the repository's data/homes.json.
+
+    Args:
+        base_dir: Directory of the hosting app (backend/ or the function app)
+    """
+    candidates = []
+    if os.environ.get("HOMES_DATA_PATH"):
+        candidates.append(os.environ["HOMES_DATA_PATH"])
+    if base_dir:
+        candidates.append(os.path.join(base_dir, "data", "homes.json"))
+        candidates.append(os.path.join(base_dir, "..", "data", "homes.json"))
+    candidates.append(os.path.join(_REPO_ROOT, "data", "homes.json"))
+
+    for data_path in candidates:
+        if os.path.exists(data_path):
+            with open(data_path, "r") as f:
+                return json.load(f)
+
+    raise FileNotFoundError(
+        f"Could not find homes.json file. Looked in: {', '.join(candidates)}"
+    )
+
+
+def _shared(name: str, factory: Callable[[], Any]) -> Any:
+    """Build a process-wide instance on first use; later calls return the same one"""
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                instance = factory()
+                _instances[name] = instance
+    return instance
+
+
+def get_backend() -> LLMBackend:
+    """The process-wide LLM backend (and its HTTP connection pool)"""
+    return _shared("backend", create_backend_from_env)
+
+
+def get_matcher(base_dir: Optional[str] = None) -> PropertyMatcher:
+    """
+    The process-wide PropertyMatcher, built on first use
+
+    Later calls return the same instance, with its indexes and caches,
+    regardless of base_dir.
+    """
+    return _shared(
+        "matcher", lambda: PropertyMatcher(load_homes_data(base_dir), backend=get_backend())
+    )
+
+
+def get_facet_index(matcher: PropertyMatcher) -> FacetIndex:
+    """The process-wide facet aggregates, kept current as the matcher's listings change"""
+    def build():
+        index = FacetIndex(matcher.canonical_homes)
+        matcher.subscribe(index)
+        return index
+    return _shared("facet_index", build)
+
+
+def get_saved_searches(matcher: PropertyMatcher) -> SavedSearchRegistry:
+    """The process-wide saved searches, re-scored in the background on listing changes"""
+    return _shared(
+        "saved_searches",
+        lambda: SavedSearchRegistry(matcher, executor=ThreadPoolExecutor(max_workers=2))
+    )
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    The process-wide admission controller in front of the matcher
+
+    Sized by MATCH_MAX_CONCURRENCY, MATCH_MAX_QUEUE_INTERACTIVE,
+    MATCH_MAX_QUEUE_BATCH and MATCH_MAX_QUEUE_WAIT_S.
+    """
+    return _shared("admission", lambda: AdmissionController(
+        max_concurrency=int(os.environ.get("MATCH_MAX_CONCURRENCY", "8")),
+        max_queue={
+            "interactive": int(os.environ.get("MATCH_MAX_QUEUE_INTERACTIVE", "64")),
+            "batch": int(os.environ.get("MATCH_MAX_QUEUE_BATCH", "16"))
+        },
+        max_wait=float(os.environ.get("MATCH_MAX_QUEUE_WAIT_S", "10"))
+    ))
+
+
+def check_query_breadth(matcher: PropertyMatcher, match_kwargs: Dict[str, Any]):
+    """
+    Reject match requests estimated to fan out too widely
+
+    Raises:
+        QueryTooBroad: The estimate exceeds MATCH_REJECT_ABOVE_CANDIDATES
+                       (0, the default, never rejects)
+    """
+    limit = int(os.environ.get("MATCH_REJECT_ABOVE_CANDIDATES", "0"))
+    if not limit:
+        return
+    estimated = matcher.estimate_cost(**match_kwargs)["estimated_candidates"]
+    if estimated > limit:
+        raise QueryTooBroad(estimated, limit)
+
+
+def authorize_listing_write(token: Optional[str]):
+    """
+    Allow listing writes only with the LISTING_ADMIN_TOKEN shared secret
+
+    Raises:
+        ListingWriteDenied: LISTING_ADMIN_TOKEN is unset (writes disabled)
+                            or `token` does not match it
+    """
+    expected = os.environ.get("LISTING_ADMIN_TOKEN", "")
+    if not expected:
+        raise ListingWriteDenied("Listing writes are disabled on this deployment")
+    if token is None or not hmac.compare_digest(token, expected):
+        raise ListingWriteDenied("Invalid or missing X-Admin-Token")
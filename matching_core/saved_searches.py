@@ -0,0 +1,343 @@
+"""
+Saved Searches - incremental re-matching when listings change
+Instead of re-running every saved search on every data refresh, a reverse
+index from listing attributes (type, then budget within each type) to saved
+searches finds the few searches a listing change can affect. For each, only
+the changed listing is compared against the search's current top 3 in one
+small LLM call; a listing that leaves the top 3 is replaced by the best
+remaining candidate from the cheap tier. An event is appended to the stream
+only when a listing enters or leaves a top 3, not when scores or order shift.
+"""
+
+import bisect
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Executor
+from typing import List, Dict, Any, Optional, Set
+
+from .filters import matches_listing
+
+logger = logging.getLogger(__name__)
+
+
+class SavedSearchRegistry:
+    """
+    Saved searches plus the reverse index used to route listing changes
+
+    Registers itself as a PropertyMatcher listener. Searches whose hard
+    constraints the new listing satisfies, or whose current top 3 contains
+    the listing, are reconciled against the change; the full candidate set
+    is only scored once, when the search is saved.
+
+    Args:
+        matcher: PropertyMatcher used for scoring
+        executor: Runs re-scoring in the background; None re-scores inline
+        max_events: Events retained for polling clients
+    """
+
+    def __init__(
+        self,
+        matcher: Any,
+        executor: Optional[Executor] = None,
+        max_events: int = 1000
+    ):
+        self.matcher = matcher
+        self.executor = executor
+
+        self._lock = threading.RLock()
+        self._searches: Dict[str, Dict[str, Any]] = {}
+
+        # Reverse index: home type -> (budget, search id) sorted by budget,
+        # plus listing id -> searches currently showing it
+        self._by_type: Dict[str, List[tuple]] = {}
+        self._by_top_listing: Dict[Any, Set[str]] = {}
+
+        self._events: deque = deque(maxlen=max_events)
+        self._next_seq = 1
+        # Search id -> listing id -> latest version (None once removed)
+        self._pending: Dict[str, Dict[Any, Optional[Dict[str, Any]]]] = {}
+
+        matcher.subscribe(self)
+
+    # ------------------------------------------------------------------
+    # Registry
+    # ------------------------------------------------------------------
+
+    def add(self, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Save a search and compute its initial top 3
+
+        Args:
+            preferences: find_matches keyword arguments (home_type, budget,
+                         amenities, custom_needs, filters)
+        """
+        search_id = uuid.uuid4().hex[:12]
+        search = {
+            "id": search_id,
+            "preferences": preferences,
+            "top": [],
+            "created_at": time.time(),
+            "updated_at": None
+        }
+
+        with self._lock:
+            self._searches[search_id] = search
+            self._index(search)
+
+        self._rescore(search_id)
+        return self.get(search_id)
+
+    def get(self, search_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            search = self._searches.get(search_id)
+            return dict(search) if search else None
+
+    def remove(self, search_id: str) -> bool:
+        with self._lock:
+            search = self._searches.pop(search_id, None)
+            if search is None:
+                return False
+            self._unindex(search)
+            return True
+
+    def __len__(self):
+        return len(self._searches)
+
+    def _index(self, search: Dict[str, Any]):
+        prefs = search["preferences"]
+        search_id = search["id"]
+        home_type = prefs.get("home_type") or "any"
+        bisect.insort(self._by_type.setdefault(home_type, []), (prefs["budget"], search_id))
+        for entry in search["top"]:
+            self._by_top_listing.setdefault(entry["id"], set()).add(search_id)
+
+    def _unindex(self, search: Dict[str, Any]):
+        prefs = search["preferences"]
+        search_id = search["id"]
+        home_type = prefs.get("home_type") or "any"
+        budgets = self._by_type[home_type]
+        del budgets[bisect.bisect_left(budgets, (prefs["budget"], search_id))]
+        if not budgets:
+            del self._by_type[home_type]
+        for entry in search["top"]:
+            self._discard(self._by_top_listing, entry["id"], search_id)
+
+    @staticmethod
+    def _discard(index: Dict[Any, Set[str]], key: Any, search_id: str):
+        members = index.get(key)
+        if members is not None:
+            members.discard(search_id)
+            if not members:
+                del index[key]
+
+    # ------------------------------------------------------------------
+    # Routing listing changes
+    # ------------------------------------------------------------------
+
+    def affected_searches(self, home: Dict[str, Any]) -> Set[str]:
+        """
+        Searches whose hard constraints this listing satisfies
+
+        Only the listing's type bucket and the "any" bucket are visited, and
+        within each only the searches whose budget covers the price, found by
+        bisection. Required amenities and ranges are checked on those alone.
+        """
+        with self._lock:
+            affected = set()
+            for home_type in (home["type"], "any"):
+                budgets = self._by_type.get(home_type)
+                if not budgets:
+                    continue
+                start = bisect.bisect_left(budgets, (home["price"], ""))
+                for _, search_id in budgets[start:]:
+                    prefs = self._searches[search_id]["preferences"]
+                    if matches_listing(home, home_type, prefs["budget"], prefs.get("filters")):
+                        affected.add(search_id)
+            return affected
+
+    def on_listing_upserted(self, home: Dict[str, Any], previous: Optional[Dict[str, Any]]):
+        with self._lock:
+            affected = self.affected_searches(home)
+            affected |= self._by_top_listing.get(home["id"], set())
+        self._schedule(affected, home["id"], home)
+
+    def on_listing_removed(self, home: Dict[str, Any]):
+        with self._lock:
+            affected = set(self._by_top_listing.get(home["id"], set()))
+        self._schedule(affected, home["id"], None)
+
+    def _schedule(self, search_ids: Set[str], listing_id: Any, home: Optional[Dict[str, Any]]):
+        if not search_ids:
+            return
+
+        if self.executor is None:
+            for search_id in search_ids:
+                self._reconcile(search_id, {listing_id: home})
+            return
+
+        # Coalesce: a search already waiting is reconciled against the latest
+        # version of every listing that changed in the meantime
+        with self._lock:
+            new_ids = []
+            for search_id in search_ids:
+                changes = self._pending.get(search_id)
+                if changes is None:
+                    changes = self._pending[search_id] = {}
+                    new_ids.append(search_id)
+                changes[listing_id] = home
+        for search_id in new_ids:
+            self.executor.submit(self._run_pending, search_id)
+
+    def _run_pending(self, search_id: str):
+        with self._lock:
+            changes = self._pending.pop(search_id, {})
+        try:
+            self._reconcile(search_id, changes)
+        except Exception:
+            logger.exception("Error re-scoring saved search %s", search_id)
+
+    def _rescore(self, search_id: str):
+        """Score one saved search over its full candidate set"""
+        with self._lock:
+            search = self._searches.get(search_id)
+            if search is None:
+                return
+            prefs = dict(search["preferences"])
+
+        self._publish(search_id, self._entries(self.matcher.find_matches(**prefs)))
+
+    def _reconcile(self, search_id: str, changes: Dict[Any, Optional[Dict[str, Any]]]):
+        """
+        Update one search's top 3 for a few changed listings
+
+        Changed listings that still satisfy the hard constraints are ranked
+        together with the unchanged top entries in one LLM call. Slots left
+        by listings that were removed or no longer qualify are refilled with
+        the best remaining candidates by the cheap tier first.
+        """
+        with self._lock:
+            search = self._searches.get(search_id)
+            if search is None:
+                return
+            prefs = dict(search["preferences"])
+            top = list(search["top"])
+
+        entering = [
+            home for home in changes.values()
+            if home is not None
+            and matches_listing(home, prefs.get("home_type"), prefs["budget"], prefs.get("filters"))
+        ]
+        kept, kept_homes = [], []
+        for entry in top:
+            home = None if entry["id"] in changes else self._current(entry["id"])
+            if home is not None:
+                kept.append(entry)
+                kept_homes.append(home)
+
+        candidates = kept_homes + entering
+        if len(candidates) < 3:
+            exclude = {home["id"] for home in candidates} | set(changes)
+            candidates += self.matcher.next_candidates(
+                exclude=exclude, limit=3 - len(candidates), **prefs
+            )
+
+        if len(candidates) == len(kept):
+            # Nothing new to compare; only departures, and nothing to refill with
+            self._publish(search_id, kept)
+            return
+
+        ranked = self._entries(self.matcher.rank_candidates(candidates, **prefs))
+        # An entry the LLM left out of a short answer keeps its place
+        ranked_ids = {entry["id"] for entry in ranked}
+        ranked += [entry for entry in kept if entry["id"] not in ranked_ids][:3 - len(ranked)]
+        self._publish(search_id, ranked)
+
+    @staticmethod
+    def _entries(matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {"id": home["id"], "score": home["score"], "explanation": home["explanation"]}
+            for home in matches[:3]
+        ]
+
+    def _current(self, listing_id: Any) -> Optional[Dict[str, Any]]:
+        """The listing as matching sees it now; None if removed or merged away"""
+        home = self.matcher.get_home(listing_id)
+        deduper = self.matcher.deduper
+        if home is None or (deduper is not None and not deduper.is_canonical(listing_id)):
+            return None
+        return home
+
+    def _publish(self, search_id: str, top: List[Dict[str, Any]]):
+        """
+        Store a new top 3; emit an event if a listing entered or left it
+
+        A listing can change while its search is being scored, before the
+        search is indexed as showing it. Entries that are no longer current
+        are re-checked here, under the lock that routes new changes, and
+        reconciled again.
+        """
+        with self._lock:
+            search = self._searches.get(search_id)
+            if search is None:
+                return
+
+            prefs = search["preferences"]
+            stale = {}
+            for entry in top:
+                home = self._current(entry["id"])
+                if home is None or not matches_listing(
+                    home, prefs.get("home_type"), prefs["budget"], prefs.get("filters")
+                ):
+                    stale[entry["id"]] = home
+
+            previous_ids = [entry["id"] for entry in search["top"]]
+            current_ids = [entry["id"] for entry in top]
+
+            for listing_id in previous_ids:
+                self._discard(self._by_top_listing, listing_id, search_id)
+            for listing_id in current_ids:
+                self._by_top_listing.setdefault(listing_id, set()).add(search_id)
+
+            search["top"] = top
+            search["updated_at"] = time.time()
+
+            if set(current_ids) != set(previous_ids):
+                self._events.append({
+                    "seq": self._next_seq,
+                    "search_id": search_id,
+                    "at": search["updated_at"],
+                    "added": [i for i in current_ids if i not in previous_ids],
+                    "removed": [i for i in previous_ids if i not in current_ids],
+                    "top": top
+                })
+                self._next_seq += 1
+
+        for listing_id, home in stale.items():
+            self._schedule({search_id}, listing_id, home)
+
+    # ------------------------------------------------------------------
+    # Event stream
+    # ------------------------------------------------------------------
+
+    def events(
+        self,
+        since: int = 0,
+        search_id: Optional[str] = None,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Top-3 change events after sequence number `since`
+
+        Returns:
+            {"events": [...], "next": cursor to pass as `since` next time}
+        """
+        with self._lock:
+            events = [
+                event for event in self._events
+                if event["seq"] > since and (search_id is None or event["search_id"] == search_id)
+            ][:limit]
+            next_cursor = events[-1]["seq"] if events else max(since, self._next_seq - 1)
+            return {"events": events, "next": next_cursor}
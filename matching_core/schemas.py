@@ -0,0 +1,93 @@
+"""
+Request/response models shared by the FastAPI backend and the Azure Function
+"""
+
+from typing import List, Optional, Dict, Any
+
+from pydantic import BaseModel
+
+
+class Range(BaseModel):
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+
+class MatchFilters(BaseModel):
+    price: Optional[Range] = None
+    bedrooms: Optional[Range] = None
+    bathrooms: Optional[Range] = None
+    sq_ft: Optional[Range] = None
+    requiredAmenities: List[str] = []
+    preferredAmenities: List[str] = []
+
+    def to_matcher_filters(self) -> dict:
+        """Convert to the plain dict understood by PropertyMatcher"""
+        filters = {
+            field: getattr(self, field).model_dump()
+            for field in ("price", "bedrooms", "bathrooms", "sq_ft")
+            if getattr(self, field) is not None
+        }
+        filters["required_amenities"] = self.requiredAmenities
+        filters["preferred_amenities"] = self.preferredAmenities
+        return filters
+
+
+class UserPreferences(BaseModel):
+    homeType: str
+    budget: int
+    amenities: List[str]
+    customNeeds: Optional[str] = ""
+    filters: Optional[MatchFilters] = None
+
+    def matcher_filters(self) -> Optional[dict]:
+        return self.filters.to_matcher_filters() if self.filters else None
+
+    def matcher_kwargs(self) -> dict:
+        """find_matches / estimate_cost keyword arguments for this request body"""
+        return {
+            "home_type": self.homeType,
+            "budget": self.budget,
+            "amenities": self.amenities,
+            "custom_needs": self.customNeeds,
+            "filters": self.matcher_filters()
+        }
+
+
+class Home(BaseModel):
+    id: int
+    name: str
+    type: str
+    price: int
+    sq_ft: int
+    bedrooms: int
+    bathrooms: float
+    amenities: List[str]
+    location: str
+    description: str
+
+
+class MatchedHome(Home):
+    score: float
+    explanation: str
+    variant_ids: List[int] = []
+
+
+class MatchResponse(BaseModel):
+    matches: List[MatchedHome]
+    message: Optional[str] = None
+    explain: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_matches(
+        cls,
+        matched_homes: List[Dict[str, Any]],
+        explain: Optional[Dict[str, Any]] = None
+    ) -> "MatchResponse":
+        """Build the response for PropertyMatcher.find_matches output"""
+        results = [MatchedHome(**home) for home in matched_homes]
+
+        message = None
+        if len(results) == 0:
+            message = "No properties found matching your criteria. Try adjusting your preferences."
+
+        return cls(matches=results, message=message, explain=explain)
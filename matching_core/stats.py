@@ -0,0 +1,24 @@
+"""
+Latency statistics shared by the load test, benchmarks and /metrics
+Standard library only, so the load test can import this module on its own.
+"""
+
+import math
+from typing import Sequence
+
+
+def percentile(ordered: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted sequence
+
+    Args:
+        ordered: Samples in ascending order
+        fraction: Percentile as a fraction, e.g. 0.95 for p95
+
+    Returns:
+        The smallest sample with at least `fraction` of the samples at or
+        below it, or 0.0 when there are no samples
+    """
+    if not ordered:
+        return 0.0
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
@@ -0,0 +1,50 @@
+"""
+Train and calibrate the learned ranker from logged LLM judgments
+`fit` trains a LearnedRanker on a judgment log (RANKER_LOG_PATH). The new
+model always defers to the LLM until `calibrate` sets its serving margins
+from a log collected while it was loaded, in which the LLM also scored the
+model's own top 3.
+
+Usage:
+    python -m matching_core.train_ranker fit --log judgments.jsonl --out ranker.json
+    python -m matching_core.train_ranker calibrate --model ranker.json --log shadow.jsonl
+"""
+
+import argparse
+import json
+
+from .ranker import FEATURES, LearnedRanker, read_judgments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and calibrate the learned ranker from logged LLM judgments")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fit = subparsers.add_parser("fit", help="train a model on a judgment log")
+    fit.add_argument("--log", required=True, help="JSONL written via RANKER_LOG_PATH")
+    fit.add_argument("--out", required=True, help="where to write the model JSON")
+    fit.add_argument("--l2", type=float, default=1.0, help="L2 regularization strength")
+
+    calibrate = subparsers.add_parser("calibrate", help="set a model's serving margins")
+    calibrate.add_argument("--model", required=True, help="model JSON to calibrate (rewritten in place)")
+    calibrate.add_argument("--log", required=True, help="JSONL logged while this model was loaded")
+    calibrate.add_argument("--max-regret", type=float, default=0.05,
+                           help="mean LLM score the model may give up per top-3 home and still serve")
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        model = LearnedRanker.fit(read_judgments(args.log), l2=args.l2)
+        model.save(args.out)
+        print(f"Trained on {model.samples} logged LLM calls; serve it to collect a calibration log")
+        for name, weight in sorted(zip(FEATURES, model.weights), key=lambda item: -abs(item[1])):
+            print(f"  {name:<24} {weight:+.4f}")
+        return
+
+    model = LearnedRanker.load(args.model)
+    metrics = model.calibrate(read_judgments(args.log), max_regret=args.max_regret)
+    model.save(args.model)
+    print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""
+Make the shared matching core importable, as backend/main.py and the
+Azure Function do by adding the repository root to sys.path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
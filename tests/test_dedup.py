@@ -0,0 +1,74 @@
+"""
+Listing deduplication as seen through PropertyMatcher writes
+The index (and every other listener) must always hold exactly the canonical
+listings, in their current versions.
+"""
+
+import json
+import os
+import random
+
+from matching_core.llm_backends import StandInBackend
+from matching_core.matcher import PropertyMatcher
+
+HOMES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "homes.json")
+
+
+def load_homes():
+    with open(HOMES_PATH, "r") as f:
+        return json.load(f)
+
+
+def make_matcher(homes):
+    return PropertyMatcher(homes, backend=StandInBackend(latency_ms=0, tokens_per_second=0))
+
+
+def assert_consistent(matcher):
+    indexed = {home["id"]: home for home in matcher.index.snapshot.homes if home is not None}
+    canonical = {home["id"]: home for home in matcher.canonical_homes}
+    assert indexed == canonical
+    assert {home["id"] for home in matcher.homes} == {
+        member for canonical_id in canonical for member in [canonical_id] + matcher.deduper.variants(canonical_id)
+    }
+
+
+def test_edit_into_a_newer_cluster_keeps_the_older_place():
+    homes = load_homes()
+    matcher = make_matcher(homes)
+
+    # Listing 1 becomes a copy of listing 5; it was added first, so it leads the cluster
+    matcher.upsert_home({**homes[4], "id": 1})
+    assert matcher.deduper.is_canonical(1)
+    assert matcher.deduper.variants(1) == [homes[4]["id"]]
+    assert_consistent(matcher)
+
+    matcher.remove_home(1)
+    assert matcher.deduper.is_canonical(homes[4]["id"])
+    assert_consistent(matcher)
+
+
+def test_random_upserts_and_removes_keep_the_index_canonical():
+    homes = load_homes()
+    matcher = make_matcher(homes)
+    rng = random.Random(11)
+    live = {home["id"]: home for home in homes}
+    next_id = max(live) + 1
+
+    for _ in range(400):
+        action = rng.random()
+        if action < 0.25 and live:
+            removed_id = rng.choice(sorted(live))
+            assert matcher.remove_home(removed_id) == live.pop(removed_id)
+        else:
+            if action < 0.5 or not live:
+                home_id, next_id = next_id, next_id + 1
+            else:
+                home_id = rng.choice(sorted(live))
+            # Relistings of a sample home at a slightly different price, or a new property
+            home = dict(rng.choice(homes), id=home_id)
+            home["price"] = int(home["price"] * rng.uniform(0.9, 1.1))
+            if rng.random() < 0.3:
+                home["description"] = f"Property {home_id} " + " ".join(rng.sample(home["description"].split(), 10))
+            matcher.upsert_home(home)
+            live[home_id] = home
+        assert_consistent(matcher)
@@ -0,0 +1,97 @@
+"""
+Learned ranker: shadow scores logged while it defers calibrate when it serves
+The gate is calibrated on LLM score regret, so a model whose top 3 differs
+from the LLM's only among near-ties still serves.
+"""
+
+import json
+import random
+import re
+
+from matching_core.bench_concurrency import synthetic_listings
+from matching_core.explain import MatchTrace
+from matching_core.llm_backends import LLMBackend, Message, _prompt_text
+from matching_core.matcher import PropertyMatcher
+from matching_core.ranker import JudgmentLog, LearnedRanker, read_judgments
+
+AMENITIES = ["pool", "gym", "park", "garage", "spa", "garden"]
+
+
+class RubricBackend(LLMBackend):
+    """Scores every candidate on budget fit and amenities; ties go to the lowest id"""
+
+    name = "rubric"
+
+    def create_message(self, model, max_tokens, temperature, messages):
+        prompt = _prompt_text(messages)
+        budget = int(re.search(r"Maximum Budget: \$([\d,]+)", prompt).group(1).replace(",", ""))
+        wanted = re.search(r"Desired Amenities: (.*)", prompt).group(1)
+        desired = set() if wanted == "none specified" else {amenity.strip() for amenity in wanted.split(",")}
+        section = prompt.split("AVAILABLE PROPERTIES:\n", 1)[1].split("\n\nTASK:", 1)[0]
+
+        evaluations = []
+        for home in json.loads(section):
+            ratio = home["price"] / budget
+            fit = 1.0 if 0.7 <= ratio <= 0.9 else max(0.0, 1.0 - abs(ratio - 0.8) * 2)
+            matched = len(desired & set(home["amenities"])) / len(desired) if desired else 0.5
+            score = round(0.4 * fit + 0.6 * matched, 3)
+            evaluations.append({"id": home["id"], "score": score, "explanation": "Rubric score."})
+        evaluations.sort(key=lambda item: (-item["score"], item["id"]))
+
+        reply = evaluations[:3]
+        also_score = re.search(r"^ALSO SCORE: (\[.*\])$", prompt, re.MULTILINE)
+        if also_score:
+            shadow = set(json.loads(also_score.group(1))) - {item["id"] for item in reply}
+            reply += [item for item in evaluations[3:] if item["id"] in shadow]
+        return Message(json.dumps(reply), model, 100, 50)
+
+
+def requests(count, seed):
+    rng = random.Random(seed)
+    return [
+        dict(
+            home_type=rng.choice(["any", "condo", "single-family"]),
+            budget=rng.randrange(300000, 1500000, 50000),
+            amenities=rng.sample(AMENITIES, rng.randint(1, 3)),
+            custom_needs=""
+        )
+        for _ in range(count)
+    ]
+
+
+def test_a_served_model_is_calibrated_on_shadow_scores(tmp_path):
+    homes = synthetic_listings(300)
+
+    training_log = str(tmp_path / "judgments.jsonl")
+    llm_only = PropertyMatcher(homes, backend=RubricBackend(), judgment_log=JudgmentLog(training_log))
+    for prefs in requests(60, seed=1):
+        llm_only.find_matches(**prefs)
+    model = LearnedRanker.fit(read_judgments(training_log))
+    assert model.segment_margin == {}
+
+    # Uncalibrated, the model defers every request; the LLM also scores its top 3
+    shadow_log = str(tmp_path / "shadow.jsonl")
+    deferring = PropertyMatcher(homes, backend=RubricBackend(), ranker=model, judgment_log=JudgmentLog(shadow_log))
+    for prefs in requests(60, seed=2):
+        deferring.find_matches(**prefs)
+    judgments = read_judgments(shadow_log)
+    assert any(record["shadow"] for record in judgments)
+
+    metrics = model.calibrate(judgments, max_regret=0.05)
+    segment = metrics["segments"]["no_custom_needs"]
+    assert segment["scored_calls"] == segment["calls"] > 0
+    assert model.segment_margin["no_custom_needs"] is not None
+    assert segment["served_regret"] <= 0.05
+
+    path = str(tmp_path / "ranker.json")
+    model.save(path)
+    serving = PropertyMatcher(homes, backend=RubricBackend(), ranker=LearnedRanker.load(path))
+    served = 0
+    for prefs in requests(20, seed=3):
+        trace = MatchTrace()
+        serving.find_matches(trace=trace, **prefs)
+        served += [stage for stage in trace.stages if stage["stage"] == "ranker"][0]["served"]
+    assert served > 0
+
+    for matcher in (llm_only, deferring, serving):
+        matcher.close()
@@ -0,0 +1,160 @@
+"""
+Saved searches react to listing changes without re-running the full match
+A change is compared against the search's current top 3 only, and events are
+emitted only when a listing enters or leaves a top 3.
+"""
+
+import json
+import os
+
+from matching_core.llm_backends import StandInBackend, _prompt_text
+from matching_core.matcher import PropertyMatcher
+from matching_core.saved_searches import SavedSearchRegistry
+
+HOMES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "homes.json")
+
+PREFERENCES = {"home_type": "any", "budget": 2000000, "amenities": ["pool"], "custom_needs": ""}
+
+
+class RecordingBackend(StandInBackend):
+    """Stand-in that records the candidate ids of every prompt"""
+
+    def __init__(self):
+        super().__init__(latency_ms=0, tokens_per_second=0)
+        self.calls = []
+
+    def create_message(self, model, max_tokens, temperature, messages):
+        self.calls.append(self._candidate_ids(_prompt_text(messages)))
+        return super().create_message(model, max_tokens, temperature, messages)
+
+
+def make_registry():
+    with open(HOMES_PATH, "r") as f:
+        homes = json.load(f)
+    backend = RecordingBackend()
+    matcher = PropertyMatcher(homes, backend=backend)
+    registry = SavedSearchRegistry(matcher)
+    search = registry.add(dict(PREFERENCES))
+    backend.calls.clear()
+    return matcher, backend, registry, search["id"], homes
+
+
+def events_after_setup(registry):
+    # The first event is the search's initial top 3
+    return registry.events(since=1)["events"]
+
+
+def top_ids(registry, search_id):
+    return [entry["id"] for entry in registry.get(search_id)["top"]]
+
+
+def new_listing(homes, listing_id, **changes):
+    return {
+        **homes[0],
+        "id": listing_id,
+        "location": f"Test Street {listing_id}",
+        "description": f"Listing {listing_id} built for the saved search tests",
+        **changes
+    }
+
+
+def test_a_new_listing_is_compared_with_the_top_3_only():
+    matcher, backend, registry, search_id, homes = make_registry()
+    before = top_ids(registry, search_id)
+
+    matcher.upsert_home(new_listing(homes, 101, price=400000))
+
+    assert len(backend.calls) == 1
+    assert sorted(backend.calls[0]) == sorted(before + [101])
+
+    after = top_ids(registry, search_id)
+    events = events_after_setup(registry)
+    if 101 in after:
+        assert len(events) == 1
+        assert events[0]["added"] == [101]
+        assert len(events[0]["removed"]) == 1
+    else:
+        assert sorted(after) == sorted(before)
+        assert events == []
+
+
+def test_rescoring_the_same_members_emits_nothing():
+    matcher, backend, registry, search_id, homes = make_registry()
+    before = top_ids(registry, search_id)
+
+    edited = dict(matcher.get_home(before[0]))
+    edited["description"] += " Freshly painted."
+    matcher.upsert_home(edited)
+
+    assert len(backend.calls) == 1
+    assert sorted(top_ids(registry, search_id)) == sorted(before)
+    assert events_after_setup(registry) == []
+
+
+def test_a_listing_outside_the_constraints_makes_no_call():
+    matcher, backend, registry, search_id, homes = make_registry()
+
+    matcher.upsert_home(new_listing(homes, 102, price=PREFERENCES["budget"] + 1))
+
+    assert backend.calls == []
+    assert events_after_setup(registry) == []
+
+
+def test_removing_a_top_listing_pulls_in_the_next_candidate():
+    matcher, backend, registry, search_id, homes = make_registry()
+    before = top_ids(registry, search_id)
+
+    matcher.remove_home(before[0])
+
+    after = top_ids(registry, search_id)
+    assert len(after) == 3
+    assert before[0] not in after
+    assert len(backend.calls) == 1
+    assert len(backend.calls[0]) == 3
+
+    events = events_after_setup(registry)
+    assert len(events) == 1
+    assert events[0]["removed"] == [before[0]]
+    assert events[0]["added"] == [listing_id for listing_id in after if listing_id not in before]
+
+
+class QueuedExecutor:
+    """Runs submitted work when drained, outside any listing write"""
+
+    def __init__(self):
+        self.queue = []
+
+    def submit(self, fn, *args):
+        self.queue.append((fn, args))
+
+    def drain(self):
+        while self.queue:
+            fn, args = self.queue.pop(0)
+            fn(*args)
+
+
+def test_a_listing_removed_while_it_is_being_scored_does_not_stay():
+    with open(HOMES_PATH, "r") as f:
+        homes = json.load(f)
+    backend = RecordingBackend()
+    matcher = PropertyMatcher(homes, backend=backend)
+    executor = QueuedExecutor()
+    registry = SavedSearchRegistry(matcher, executor=executor)
+    search_id = registry.add(dict(PREFERENCES))["id"]
+
+    # Remove listing 103 during the call that compares it with the top 3,
+    # before the search is indexed as showing it
+    scoring = backend.create_message
+
+    def remove_mid_call(*args, **kwargs):
+        backend.create_message = scoring
+        matcher.remove_home(103)
+        return scoring(*args, **kwargs)
+
+    backend.create_message = remove_mid_call
+    matcher.upsert_home(new_listing(homes, 103, price=400000))
+    executor.drain()
+
+    after = top_ids(registry, search_id)
+    assert 103 not in after
+    assert len(after) == 3
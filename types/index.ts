@@ -13,21 +13,49 @@ export interface Home {
   description: string;
 }
 
+export interface Range {
+  min?: number;
+  max?: number;
+}
+
+export interface MatchFilters {
+  price?: Range;
+  bedrooms?: Range;
+  bathrooms?: Range;
+  sq_ft?: Range;
+  requiredAmenities?: string[];
+  preferredAmenities?: string[];
+}
+
 export interface UserPreferences {
   homeType: string;
   budget: number;
   amenities: string[];
   customNeeds: string;
+  filters?: MatchFilters;
 }
 
 export interface MatchedHome extends Home {
   score: number;
   explanation: string;
+  variant_ids?: number[];  // other listings of the same property (relistings, agent copies)
+}
+
+// Execution plan and per-stage figures returned by /match?explain=true
+export interface MatchExplain {
+  estimate: Record<string, unknown> | null;
+  plan: Record<string, unknown>[];
+  stages: Record<string, unknown>[];
+  tokens: Record<string, unknown>;
+  cache: Record<string, { hits: number; misses: number }>;
+  notes: string[];
+  total_ms: number;
 }
 
 export interface MatchResponse {
   matches: MatchedHome[];
   message?: string;
+  explain?: MatchExplain | null;
 }
 
 export interface FormData {